@@ -0,0 +1,145 @@
+"""Micro-benchmarks for the archive-side code on a generated archive.
+
+Generates ``--files`` small JSON articles (a share of them with undated
+'YYYY-MM <title>.json' names) and times filename cleaning, saving, date lookups
+with and without the catalog, catalog rebuilds, the duplicate scan and the
+re-date planner:
+
+    python benchmarks/bench_archive.py --files 1000000 --archive /mnt/scratch/bench-archive
+
+An existing ``--archive`` directory is reused, so the (slow) generation only
+happens once for a given size.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'news_crawler'))
+
+from analyst import Analyst  # noqa: E402
+from catalog import ArchiveCatalog, rebuild_catalog  # noqa: E402
+from directory_operations import clean_filename, save_article_data  # noqa: E402
+from duplicates import DuplicateFinder  # noqa: E402
+from redate import plan_source  # noqa: E402
+
+WORDS = 'council budget school road city mayor vote report market growth energy policy health court'.split()
+TITLE = "Mayor's \"Budget\" Vote: What <Changes> for Schools/Roads? | Café Edition"
+
+
+def make_article(rng, source, number):
+    day = rng.randint(1, 28)
+    month = rng.randint(1, 12)
+    year = rng.choice((2022, 2023, 2024))
+    title = f"{source} story {number} about the {rng.choice(WORDS)} {rng.choice(WORDS)}"
+    text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(80, 200)))
+    return {
+        'url': f"https://{source}.example.com/{year}/{month:02d}/{day:02d}/story-{number}",
+        'title': title,
+        'publish_date': f"{year}-{month:02d}-{day:02d}T10:00:00",
+        'text': text,
+        'authors': ['Reporter'],
+    }
+
+
+def generate_archive(base_directory, files, sources, undated_share=0.05, duplicate_share=0.02, seed=0):
+    """Write ``files`` articles spread over ``sources`` directories in the one-file-per-article layout."""
+    rng = random.Random(seed)
+    texts = []
+    for number in range(files):
+        source = f"source{number % sources}"
+        article = make_article(rng, source, number)
+        if texts and rng.random() < duplicate_share:
+            article['text'] = rng.choice(texts)
+        elif len(texts) < 1000:
+            texts.append(article['text'])
+        year, month, day = article['publish_date'][:10].split('-')
+        directory = os.path.join(base_directory, source, year, month)
+        os.makedirs(directory, exist_ok=True)
+        prefix = f"{year}-{month}" if rng.random() < undated_share else f"{year}-{month}-{day}"
+        with open(os.path.join(directory, f"{prefix} {article['title']}.json"), 'w', encoding='utf-8') as f:
+            json.dump(article, f, indent=4)
+        if number and number % 100000 == 0:
+            logging.warning(f"Generated {number} files")
+
+
+def timed(name, func, results, **details):
+    start = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - start
+    results.append({'benchmark': name, 'seconds': round(elapsed, 4), **details})
+    print(json.dumps(results[-1]))
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for archive-side code on a generated archive.')
+    parser.add_argument('--files', type=int, default=20000, help='Articles in the generated archive (default: %(default)s)')
+    parser.add_argument('--sources', type=int, default=20, help='Source directories (default: %(default)s)')
+    parser.add_argument('--archive', type=str, help='Archive directory to generate into or reuse (default: a temporary directory)')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes for the parallel tools (default: %(default)s)')
+    parser.add_argument('--saves', type=int, default=2000, help='Articles written by the save_article benchmark (default: %(default)s)')
+    parser.add_argument('--output', type=str, help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    temporary = tempfile.TemporaryDirectory() if args.archive is None else None
+    base_directory = args.archive or temporary.name
+    results = []
+    try:
+        if not os.path.isdir(base_directory) or not any(not name.startswith('.') for name in os.listdir(base_directory)):
+            os.makedirs(base_directory, exist_ok=True)
+            timed('generate_archive', lambda: generate_archive(base_directory, args.files, args.sources), results, files=args.files)
+
+        calls = 20000
+        seconds = timeit.timeit(lambda: clean_filename(TITLE, 'Linux'), number=calls)
+        results.append({'benchmark': 'clean_filename', 'seconds': round(seconds, 4), 'per_call_us': round(seconds / calls * 1e6, 2)})
+        print(json.dumps(results[-1]))
+
+        with tempfile.TemporaryDirectory() as save_directory:
+            rng = random.Random(1)
+            articles = [make_article(rng, 'saved', number) for number in range(args.saves)]
+            catalog = ArchiveCatalog(os.path.join(save_directory, '.catalog.sqlite3'))
+            timed('save_article', lambda: [save_article_data(article, 'saved', save_directory, 'Linux') for article in articles],
+                  results, articles=args.saves)
+            timed('save_article_dedupe', lambda: [save_article_data(article, 'saved', save_directory, 'Linux', catalog=catalog, dedupe='skip')
+                                                  for article in articles], results, articles=args.saves)
+
+        dates = [f"2024-06-{day:02d}" for day in range(1, 29)]
+        matches = timed('get_articles_by_date_scan', lambda: [path for date in dates
+                                                              for path in Analyst().get_articles_by_date(base_directory, date)],
+                        results, queries=len(dates))
+        with tempfile.TemporaryDirectory() as state_directory:
+            catalog = ArchiveCatalog(os.path.join(state_directory, '.catalog.sqlite3'))
+            timed('rebuild_catalog', lambda: rebuild_catalog(catalog, base_directory, workers=args.workers), results)
+            catalogued = timed('get_articles_by_date_catalog', lambda: [path for date in dates
+                                                                        for path in Analyst(catalog).get_articles_by_date(base_directory, date)],
+                               results, queries=len(dates))
+            results[-1]['matches'] = len(catalogued)
+            results[-3]['matches'] = len(matches)
+
+            finder = DuplicateFinder(base_directory, os.path.join(state_directory, '.duplicates.sqlite3'))
+            timed('duplicates_scan', lambda: finder.scan(args.workers), results)
+            timed('duplicates_rescan_unchanged', lambda: finder.scan(args.workers), results)
+            timed('duplicates_by_content', finder.duplicates_by_content, results)
+
+        sources = sorted(name for name in os.listdir(base_directory) if not name.startswith('.'))
+        planned = timed('redate_plan', lambda: sum(len(plan_source(os.path.join(base_directory, name))) for name in sources), results)
+        results[-1]['renames'] = planned
+    finally:
+        if temporary is not None:
+            temporary.cleanup()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
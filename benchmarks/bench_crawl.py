@@ -0,0 +1,138 @@
+"""End-to-end crawl benchmarks against local fake news sites.
+
+Runs one NewsCrawler cycle and one ArticleDownloader pass and reports
+articles/sec, p50/p99 latency per pipeline stage, peak RSS and files written:
+
+    python benchmarks/bench_crawl.py --sites 8 --articles 100 --latency 0.05
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'news_crawler'))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_site import FakeNewsServer  # noqa: E402
+from article_downloader import ArticleDownloader  # noqa: E402
+from discovery import FeedDiscovery  # noqa: E402
+from metrics import CrawlMetrics, Histogram  # noqa: E402
+from scraper import NewsCrawler  # noqa: E402
+from seen_index import SeenIndex  # noqa: E402
+
+# Log-spaced from 0.1 ms to about 100 s, fine enough for p99 to mean something.
+FINE_BUCKETS = tuple(round(0.0001 * 1.25 ** step, 6) for step in range(63))
+
+
+def peak_rss_mb():
+    # Lifetime peak, unaffected by the crawler resetting VmHWM at the start of each cycle.
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / 1024 / 1024 if sys.platform == 'darwin' else usage / 1024
+
+
+def count_files(directory):
+    return sum(len([file for file in files if not file.startswith('.')])
+               for root, dirs, files in os.walk(directory) if not os.path.basename(root).startswith('.'))
+
+
+def bench_news_crawler(fake, archive_directory, args):
+    config = {
+        'settings': {'base_archive_dir': archive_directory},
+        'news_sources': {f"site{number}": {'base_url': url, 'category': 'News'} for number, url in enumerate(fake.base_urls)},
+    }
+    metrics = CrawlMetrics()
+    metrics.stage_seconds = Histogram('crawler_article_stage_seconds', 'Per-article time spent in each stage', ('stage',), FINE_BUCKETS)
+    seen_index = SeenIndex(os.path.join(archive_directory, '.seen_urls.sqlite3'))
+    discovery = FeedDiscovery(os.path.join(archive_directory, '.discovery.sqlite3'), seen_index) if args.discovery else None
+    crawler = NewsCrawler(config, archive_directory, build_workers=args.build_workers, download_workers=args.download_workers,
+                          parse_workers=args.parse_workers, seen_index=seen_index, discovery=discovery,
+                          run_nlp=args.nlp, metrics=metrics)
+    start = time.perf_counter()
+    crawler.run(run_once=True)
+    elapsed = time.perf_counter() - start
+    saved = metrics.articles.to_dict().get('save,ok', 0)
+    return {
+        'benchmark': 'news_crawler',
+        'seconds': round(elapsed, 3),
+        'articles': saved,
+        'articles_per_second': round(saved / elapsed, 1) if elapsed else None,
+        'stages': {stage: {'p50': metrics.stage_seconds.quantile(0.5, stage=stage),
+                           'p99': metrics.stage_seconds.quantile(0.99, stage=stage)}
+                   for stage in ('download', 'parse', 'nlp', 'save')},
+        'files_written': count_files(archive_directory),
+    }
+
+
+def bench_article_downloader(fake, archive_directory, args):
+    urls_file = os.path.join(archive_directory, 'urls.txt')
+    with open(urls_file, 'w') as f:
+        f.writelines(f"{url}\n" for url in fake.article_urls())
+    downloader = ArticleDownloader({
+        'urls_file_path': urls_file,
+        'base_archive_directory': archive_directory,
+        'source_name': 'fake',
+        'max_workers': args.download_workers,
+        'fetch_engine': args.fetch_engine,
+        'politeness_enabled': False,
+        'nlp_during_crawl': args.nlp,
+    })
+    start = time.perf_counter()
+    downloader.download_articles()
+    elapsed = time.perf_counter() - start
+    files = count_files(os.path.join(archive_directory, 'fake'))
+    return {
+        'benchmark': 'article_downloader',
+        'seconds': round(elapsed, 3),
+        'articles': files,
+        'articles_per_second': round(files / elapsed, 1) if elapsed else None,
+        'files_written': files,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end crawl benchmarks against local fake news sites.')
+    parser.add_argument('--sites', type=int, default=4, help='Fake sites to serve (default: %(default)s)')
+    parser.add_argument('--articles', type=int, default=50, help='Articles per site (default: %(default)s)')
+    parser.add_argument('--paragraphs', type=int, default=12, help='Paragraphs per article (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response (default: %(default)s)')
+    parser.add_argument('--build-workers', type=int, default=3)
+    parser.add_argument('--download-workers', type=int, default=12)
+    parser.add_argument('--parse-workers', type=int, default=6)
+    parser.add_argument('--fetch-engine', choices=['newspaper', 'async'], default='newspaper', help='ArticleDownloader fetch engine')
+    parser.add_argument('--nlp', action='store_true', help='Run article.nlp() during the crawl (needs nltk)')
+    parser.add_argument('--discovery', action='store_true', help='Discover articles through the RSS feeds')
+    parser.add_argument('--only', choices=['news_crawler', 'article_downloader'], help='Run a single benchmark')
+    parser.add_argument('--output', type=str, help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    # The crawler modules configure root logging on import; keep benchmark output readable.
+    logging.getLogger().setLevel(logging.WARNING)
+    results = []
+    with FakeNewsServer(args.sites, args.articles, args.paragraphs, args.latency) as fake:
+        for name, bench in (('news_crawler', bench_news_crawler), ('article_downloader', bench_article_downloader)):
+            if args.only and args.only != name:
+                continue
+            with tempfile.TemporaryDirectory() as archive_directory:
+                result = bench(fake, archive_directory, args)
+            peak = peak_rss_mb()
+            result['peak_rss_mb'] = round(peak, 1) if peak is not None else None
+            results.append(result)
+            print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Local fake news sites for benchmarks.
+
+Each site is served on its own port and has a homepage, category pages, an
+RSS feed and article pages with a publish date, so newspaper's source
+building, discovery and parsing all do real work without touching the network.
+"""
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CATEGORIES = ('politics', 'business', 'technology', 'science', 'sports')
+WORDS = ('council budget school road city mayor vote report market growth energy policy health court '
+         'election season team research climate water housing transit police union tax ruling').split()
+
+
+def paragraph(rng, sentences=5):
+    return ' '.join(
+        ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 18))).capitalize() + '.'
+        for _ in range(sentences)
+    )
+
+
+class FakeNewsSite:
+    """Deterministic content for one site: ``articles`` stories spread over the categories."""
+
+    def __init__(self, site_id, articles=50, paragraphs=12, seed=0):
+        self.site_id = site_id
+        self.articles = articles
+        self.paragraphs = paragraphs
+        self.seed = seed
+
+    def article_path(self, number):
+        category = CATEGORIES[number % len(CATEGORIES)]
+        return f"/{category}/2024/06/{number % 28 + 1:02d}/site-{self.site_id}-story-about-the-{category}-news-number-{number}"
+
+    def homepage(self):
+        links = ''.join(f"<li><a href='/{category}/'>{category.title()}</a></li>" for category in CATEGORIES)
+        stories = ''.join(
+            f"<li><a href='{self.article_path(number)}'>Site {self.site_id} story about the news number {number}</a></li>"
+            for number in range(self.articles)
+        )
+        return (f"<html><head><title>Site {self.site_id}</title>"
+                f"<link rel='alternate' type='application/rss+xml' href='/rss.xml'></head>"
+                f"<body><nav><ul>{links}</ul></nav><ul>{stories}</ul></body></html>")
+
+    def category_page(self, category):
+        stories = ''.join(
+            f"<li><a href='{self.article_path(number)}'>Site {self.site_id} story about the news number {number}</a></li>"
+            for number in range(self.articles) if CATEGORIES[number % len(CATEGORIES)] == category
+        )
+        return f"<html><head><title>{category.title()}</title></head><body><ul>{stories}</ul></body></html>"
+
+    def rss(self, base_url):
+        items = ''.join(
+            f"<item><title>Story {number}</title><link>{base_url}{self.article_path(number)}</link></item>"
+            for number in range(self.articles)
+        )
+        return f"<?xml version='1.0'?><rss version='2.0'><channel><title>Site {self.site_id}</title>{items}</channel></rss>"
+
+    def article(self, number):
+        rng = random.Random(self.seed * 1_000_003 + self.site_id * 10_007 + number)
+        day = number % 28 + 1
+        body = ''.join(f"<p>{paragraph(rng)}</p>" for _ in range(self.paragraphs))
+        return (f"<html><head><title>Site {self.site_id} story about the news number {number}</title>"
+                f"<meta property='article:published_time' content='2024-06-{day:02d}T10:00:00'>"
+                f"<meta name='author' content='Reporter {number % 7}'></head>"
+                f"<body><article><h1>Site {self.site_id} story about the news number {number}</h1>{body}</article></body></html>")
+
+    def route(self, path, base_url):
+        path = path.split('?')[0]
+        if path in ('', '/'):
+            return 'text/html', self.homepage()
+        if path == '/rss.xml':
+            return 'application/rss+xml', self.rss(base_url)
+        parts = path.strip('/').split('/')
+        if len(parts) == 1 and parts[0] in CATEGORIES:
+            return 'text/html', self.category_page(parts[0])
+        if len(parts) == 5 and parts[-1].rsplit('-', 1)[-1].isdigit():
+            return 'text/html', self.article(int(parts[-1].rsplit('-', 1)[-1]))
+        return None, None
+
+
+class FakeNewsServer:
+    """Serve ``sites`` fake sites on consecutive ephemeral ports with optional per-request ``latency`` seconds."""
+
+    def __init__(self, sites=4, articles=50, paragraphs=12, latency=0.0, seed=0):
+        self.sites = [FakeNewsSite(site_id, articles, paragraphs, seed) for site_id in range(sites)]
+        self.latency = latency
+        self.servers = []
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _handler(self, site):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                content_type, body = site.route(self.path, f"http://{self.headers.get('Host')}")
+                if body is None:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', f"{content_type}; charset=utf-8")
+                self.send_header('Content-Length', str(len(data)))
+                self.send_header('Last-Modified', formatdate(usegmt=True))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        for site in self.sites:
+            server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler(site))
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers.append(server)
+        return self
+
+    @property
+    def base_urls(self):
+        return [f"http://127.0.0.1:{server.server_port}" for server in self.servers]
+
+    def article_urls(self):
+        return [f"{base_url}{site.article_path(number)}"
+                for base_url, site in zip(self.base_urls, self.sites) for number in range(site.articles)]
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve fake news sites until interrupted.')
+    parser.add_argument('--sites', type=int, default=4)
+    parser.add_argument('--articles', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+    with FakeNewsServer(args.sites, args.articles, latency=args.latency) as fake:
+        for url in fake.base_urls:
+            print(url)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -2,12 +2,24 @@ import os
 import logging
 from logging_handler import  LoggingHandler
 from config_handler import ConfigHandler
+from archive_store import SHARD_EXTENSIONS, read_index
+from catalog import open_existing_catalog
+from enrich import load_enriched_article
 import time
 from pathlib import Path
 class Analyst:
+    def __init__(self, catalog=None, enrichment=None, search_index=None, columnar=None):
+        self.catalog = catalog
+        self.enrichment = enrichment
+        self.search_index = search_index
+        self.columnar = columnar
 
     def get_articles_by_date(self,base_dir, date):
         _start_time = time.time()
+        if self.catalog is not None:
+            matched_files = self.catalog.by_date(date)
+            logging.info(f"Analyst: get_articles_by_date: {time.time() - _start_time} seconds, {len(matched_files)} articles")
+            return matched_files
         year, month, day = date.split('-')
         matched_files = []
         for source in os.listdir(base_dir):
@@ -16,10 +28,74 @@ class Analyst:
                 for file in os.listdir(source_path):
                     if file.startswith(date):
                         matched_files.append(os.path.join(source_path, file))
+            for extension in SHARD_EXTENSIONS.values():
+                shard_path = os.path.join(base_dir, source, year, f"{month}{extension}")
+                if os.path.isfile(shard_path):
+                    for entry in read_index(shard_path):
+                        if (entry.get('publish_date') or '').startswith(date):
+                            matched_files.append(f"{shard_path}#{entry['offset']}")
         _end_time = time.time()
         logging.info(f"Analyst: get_articles_by_date: {_end_time - _start_time} seconds, {len(matched_files)} articles")
         return matched_files
 
+    def get_articles_by_date_range(self, start_date, end_date, source=None, category=None):
+        """Articles published between two dates inclusive, optionally limited to a source or category."""
+        _start_time = time.time()
+        matched_files = self._require_catalog().by_date_range(start_date, end_date, source, category)
+        logging.info(f"Analyst: get_articles_by_date_range: {time.time() - _start_time} seconds, {len(matched_files)} articles")
+        return matched_files
+
+    def get_articles_by_source(self, source):
+        return self._require_catalog().by_source(source)
+
+    def get_articles_by_category(self, category):
+        return self._require_catalog().by_category(category)
+
+    def search(self, query, start_date=None, end_date=None, source=None, category=None, limit=50):
+        """Articles matching a full-text query, most relevant first.
+
+        ``query`` uses FTS5 syntax: ``AND``/``OR``/``NOT``, ``"exact phrase"``,
+        ``prefix*`` and column filters like ``title: budget``.
+        """
+        if self.search_index is None:
+            raise RuntimeError("Search needs the full-text index; create the Analyst with search_index=create_search_index(...)")
+        _start_time = time.time()
+        results = self.search_index.search(query, start_date, end_date, source, category, limit)
+        logging.info(f"Analyst: search: {time.time() - _start_time} seconds, {len(results)} articles")
+        return [result['path'] for result in results]
+
+    def article_counts_by_day(self, start_date=None, end_date=None, source=None, category=None):
+        """pyarrow Table of ``source, day, articles`` computed from the Parquet export."""
+        _start_time = time.time()
+        counts = self._require_columnar().counts_per_source_per_day(start_date, end_date, source, category)
+        logging.info(f"Analyst: article_counts_by_day: {time.time() - _start_time} seconds, {counts.num_rows} rows")
+        return counts
+
+    def keyword_frequency(self, keywords=None, period='month', start_date=None, end_date=None, source=None, category=None):
+        """pyarrow Table of ``period, keyword, articles`` computed from the Parquet export."""
+        _start_time = time.time()
+        frequency = self._require_columnar().keyword_frequency(keywords, period, start_date, end_date, source, category)
+        logging.info(f"Analyst: keyword_frequency: {time.time() - _start_time} seconds, {frequency.num_rows} rows")
+        return frequency
+
+    def _require_columnar(self):
+        if self.columnar is None:
+            raise RuntimeError("This query needs the Parquet export; create the Analyst with columnar=open_columnar_archive(...)")
+        return self.columnar
+
+    def _require_catalog(self):
+        if self.catalog is None:
+            raise RuntimeError("This query needs the archive catalog; create the Analyst with catalog=open_existing_catalog(...) "
+                               "after building it with catalog.py")
+        return self.catalog
+
+    def load_article(self, reference):
+        """Load an article returned by one of the query methods, from either archive layout.
+
+        With an enrichment store, keywords and summaries computed after the crawl are filled in.
+        """
+        return load_enriched_article(reference, self.enrichment)
+
 
 if __name__ == '__main__':
     config_path = Path(__file__).resolve().parent.parent / 'config.yml'
@@ -29,7 +105,11 @@ if __name__ == '__main__':
     logging.info
 
     base_archive_directory = r'Z:\data\archive\news'
-    analyst = Analyst()
+    catalog = open_existing_catalog(config['settings'], base_archive_directory)
+    if catalog is None:
+        logging.warning("No archive catalog has been built; scanning the archive directories instead. "
+                        "Run catalog.py to build it for faster queries.")
+    analyst = Analyst(catalog)
     search_date = '2024-06-18'
     matched_files = analyst.get_articles_by_date(base_archive_directory, search_date)
 
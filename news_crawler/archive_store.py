@@ -0,0 +1,243 @@
+import argparse
+import concurrent.futures
+import gzip
+import json
+import logging
+import os
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SHARD_EXTENSIONS = {'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}
+INDEX_EXTENSION = '.idx'
+ARTICLE_EXTENSIONS = ('.json', '.json.gz')
+
+
+def _compress(data, compression):
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data, compression):
+    if compression == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _read_frame(shard, compression):
+    """Decompress the single frame starting at the current position of ``shard``."""
+    if compression == 'zstd':
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        decompressor = zlib.decompressobj(wbits=31)
+    chunks = []
+    while not decompressor.eof:
+        data = shard.read(65536)
+        if not data:
+            break
+        chunks.append(decompressor.decompress(data))
+    return b''.join(chunks)
+
+
+def _compression_for(shard_path):
+    for compression, extension in SHARD_EXTENSIONS.items():
+        if shard_path.endswith(extension):
+            return compression
+    raise ValueError(f"Not a shard file: {shard_path}")
+
+
+def _index_path(shard_path):
+    return shard_path[:-len(SHARD_EXTENSIONS[_compression_for(shard_path)])] + INDEX_EXTENSION
+
+
+class ShardStore:
+    """Append-only, per-source, per-month compressed JSONL shards.
+
+    Articles for ``<source>/<year>/<month>`` are appended to
+    ``<base>/<source>/<year>/<month>.jsonl.gz`` (or ``.jsonl.zst``). Each article
+    is its own compressed frame, so the ``<month>.idx`` offset index next to the
+    shard is enough to read one article without touching the rest. Index lines
+    also carry url, title and publish_date, so date lookups never decompress.
+    Appends hold an exclusive ``flock`` on the shard where the platform has
+    one, so several processes or crawler nodes can write the same shard.
+    """
+
+    def __init__(self, base_archive_directory, compression='gzip'):
+        if compression not in SHARD_EXTENSIONS:
+            raise ValueError(f"Unsupported archive compression: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("archive_compression 'zstd' requires the zstandard package")
+        self.base_archive_directory = base_archive_directory
+        self.compression = compression
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def shard_path(self, source_name, year, month):
+        return os.path.join(self.base_archive_directory, source_name, str(year), f"{month}{SHARD_EXTENSIONS[self.compression]}")
+
+    def _lock_for(self, shard_path):
+        with self._locks_lock:
+            return self._locks.setdefault(shard_path, threading.Lock())
+
+    def append(self, article_data, source_name, year, month):
+        """Append one article and return its reference (``<shard path>#<offset>``)."""
+        shard_path = self.shard_path(source_name, year, month)
+        os.makedirs(os.path.dirname(shard_path), exist_ok=True)
+        frame = _compress(json.dumps(article_data, ensure_ascii=False).encode('utf-8'), self.compression)
+        with self._lock_for(shard_path), open(shard_path, 'ab') as shard:
+            if fcntl is not None:
+                # Crawler nodes sharing the archive append to the same shards; the lock goes with the file.
+                fcntl.flock(shard, fcntl.LOCK_EX)
+            offset = shard.seek(0, os.SEEK_END)
+            shard.write(frame)
+            shard.flush()
+            entry = {
+                'offset': offset,
+                'length': len(frame),
+                'publish_date': article_data.get('publish_date'),
+                'title': article_data.get('title'),
+                'url': article_data.get('url'),
+            }
+            with open(_index_path(shard_path), 'a', encoding='utf-8') as index:
+                index.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        logging.debug(f"Article appended to {shard_path} at offset {offset}")
+        return f"{shard_path}#{offset}"
+
+
+def is_article_file(path):
+    """True for one-article files, plain or gzip-compressed."""
+    return path.endswith(ARTICLE_EXTENSIONS)
+
+
+def is_shard(path):
+    return any(path.endswith(extension) for extension in SHARD_EXTENSIONS.values())
+
+
+def reference_path(reference):
+    """Return the file holding the article behind a reference."""
+    path, _, offset = reference.rpartition('#')
+    if path and offset.isdigit() and is_shard(path):
+        return path
+    return reference
+
+
+def read_index(shard_path):
+    """Return the index entries of a shard, in append order."""
+    index_path = _index_path(shard_path)
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, 'r', encoding='utf-8') as index:
+        return [json.loads(line) for line in index if line.strip()]
+
+
+def load_article(reference):
+    """Load an article from a JSON file path or a ``<shard path>#<offset>`` reference."""
+    path, _, offset = reference.rpartition('#')
+    if path and offset.isdigit() and is_shard(path):
+        with open(path, 'rb') as shard:
+            shard.seek(int(offset))
+            return json.loads(_read_frame(shard, _compression_for(path)))
+    if reference.endswith('.gz'):
+        with gzip.open(reference, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    with open(reference, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_shard(shard_path):
+    """Yield ``(reference, article)`` for every article in one shard."""
+    compression = _compression_for(shard_path)
+    with open(shard_path, 'rb') as shard:
+        for entry in read_index(shard_path):
+            shard.seek(entry['offset'])
+            frame = shard.read(entry['length'])
+            yield f"{shard_path}#{entry['offset']}", json.loads(_decompress(frame, compression))
+
+
+def iter_archive(directory):
+    """Yield ``(reference, article)`` for every article below ``directory`` in either layout."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file in sorted(files):
+            path = os.path.join(root, file)
+            try:
+                if is_article_file(file):
+                    yield path, load_article(path)
+                elif is_shard(file):
+                    yield from iter_shard(path)
+            except Exception as e:
+                logging.error(f"Failed to read '{path}': {e}", exc_info=True)
+
+
+def create_store(settings, base_archive_directory):
+    """Return a ShardStore when ``archive_format`` is 'shards', otherwise None for one file per article."""
+    if settings.get('archive_format', 'files') != 'shards':
+        return None
+    return ShardStore(base_archive_directory, settings.get('archive_compression', 'gzip'))
+
+
+def migrate_source(source_directory, destination_directory, compression, delete):
+    """Move one source's JSON files into shards, returning the number of articles migrated."""
+    source_name = os.path.basename(source_directory)
+    store = ShardStore(destination_directory, compression)
+    migrated = 0
+    for root, dirs, files in os.walk(source_directory):
+        dirs.sort()
+        relative = os.path.relpath(root, source_directory).split(os.sep)
+        if len(relative) != 2:
+            continue
+        year, month = relative
+        for file in sorted(files):
+            if not is_article_file(file):
+                continue
+            path = os.path.join(root, file)
+            try:
+                store.append(load_article(path), source_name, year, month)
+                migrated += 1
+                if delete:
+                    os.remove(path)
+            except Exception as e:
+                logging.error(f"Failed to migrate '{path}': {e}", exc_info=True)
+    logging.info(f"Migrated {migrated} articles from {source_directory}")
+    return migrated
+
+
+def migrate(source_directory, destination_directory, compression='gzip', workers=4, delete=False):
+    """Convert a one-file-per-article archive into shards, one source per worker process."""
+    sources = sorted(
+        os.path.join(source_directory, name) for name in os.listdir(source_directory)
+        if os.path.isdir(os.path.join(source_directory, name)) and not name.startswith('.')
+    )
+    total = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(migrate_source, path, destination_directory, compression, delete) for path in sources]
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                total += future.result()
+            except Exception as e:
+                logging.error(f"Error migrating a source: {e}", exc_info=True)
+    logging.info(f"Migrated {total} articles from {len(sources)} sources into {destination_directory}")
+    return total
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Migrate a one-file-per-article archive to compressed shards.')
+    parser.add_argument('source', help='Existing archive directory (<source>/<year>/<month>/*.json)')
+    parser.add_argument('destination', help='Directory to write shards to; may be the same as source')
+    parser.add_argument('--compression', choices=sorted(SHARD_EXTENSIONS), default='gzip')
+    parser.add_argument('--workers', type=int, default=4, help='Sources migrated in parallel (default: %(default)s)')
+    parser.add_argument('--delete', action='store_true', help='Delete each JSON file once it has been migrated')
+    args = parser.parse_args()
+
+    migrate(args.source, args.destination, args.compression, args.workers, args.delete)
@@ -1,12 +1,17 @@
 import logging
 import os
-import re
-from datetime import datetime
 from newspaper import Article
-from unidecode import unidecode
 import platform
 import concurrent.futures
-import json
+import threading
+from fetcher import create_fetcher
+from politeness import create_controller, download_article
+from archive_store import create_store
+from catalog import open_catalog
+from directory_operations import save_article_data
+from search_index import create_search_index
+from harvester import LinkStore
+from seen_index import SeenIndex
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -14,76 +19,47 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 class ArticleDownloader:
     def __init__(self, config):
         self.urls_file_path = config['urls_file_path']
+        self.harvest_source = config.get('harvest_source')
         self.base_archive_directory = config['base_archive_directory']
         self.source_name = config['source_name']
         self.max_workers = config.get('max_workers', 5)
         self.os_type = platform.system()
-        self.urls = self.read_urls()
-
-    # Function to read URLs from a file
-    def read_urls(self):
+        self.controller = create_controller(config, self.base_archive_directory)
+        self.fetcher = create_fetcher(config, self.controller)
+        self.store = create_store(config, self.base_archive_directory)
+        self.catalog = open_catalog(config, self.base_archive_directory)
+        self.search_index = create_search_index(config, self.base_archive_directory)
+        self.category = config.get('category')
+        self.file_compression = config.get('file_compression')
+        self.dedupe_content = config.get('dedupe_content') or 'off'
+        self.max_in_flight = config.get('max_in_flight', 1000)
+        self.run_nlp = config.get('nlp_during_crawl', True)
+        self.seen_index = SeenIndex(config.get('archive_index_file') or os.path.join(self.base_archive_directory, '.seen_urls.sqlite3'))
+        self.progress = ProgressTracker(config.get('progress_file') or f"{self.urls_file_path}.progress")
+
+    # Function to lazily read (position, URL) pairs from a file, or from a harvester link store (*.sqlite3)
+    def iter_urls(self):
         try:
+            if self.urls_file_path.endswith('.sqlite3'):
+                urls = LinkStore(self.urls_file_path).iter_urls(self.harvest_source)
+                for position, url in enumerate(urls):
+                    yield position, url
+                return
             with open(self.urls_file_path, 'r') as file:
-                urls = file.read().splitlines()
-                return urls
+                for position, line in enumerate(file):
+                    url = line.strip()
+                    if url:
+                        yield position, url
+                    else:
+                        self.progress.complete(position)
         except Exception as e:
             logging.error(f"Error reading URLs from file: {e}")
-            return []
-
-    # Function to clean filename
-    def clean_filename(self, title):
-        max_length = 255
-        windows_restricted_chars = r'[<>:"/\\|?*]'
-        linux_restricted_chars = r'[<>:"/\\|?*\']'
-
-        try:
-            title_ascii = unidecode(title)
-            if self.os_type.lower() == 'linux':
-                title_clean = re.sub(linux_restricted_chars, '', title_ascii)
-            else:
-                title_clean = re.sub(windows_restricted_chars, '', title_ascii)
-                title_clean = title_clean.rstrip('. ')
-                title_clean = title_clean[:max_length]
-            return title_clean
-        except Exception as e:
-            logging.error(f"Error cleaning filename: {e}")
-            return "unknown_title"
-
-    # Function to extract year, month, and day from publish date
-    def extract_year_month_day(self, timestamp):
-        try:
-            if isinstance(timestamp, str):
-                dt = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-            elif isinstance(timestamp, datetime):
-                dt = timestamp
-            else:
-                raise ValueError("Unsupported timestamp format")
-            return dt.year, f"{dt.month:02d}", f"{dt.day:02d}"
-        except Exception as e:
-            logging.error(f"Error extracting year, month, and day: {e}")
-            return None, None, None
 
     # Function to save article as JSON
     def save_article(self, article):
         try:
-            publish_date = article.publish_date
-            title = article.title
-            clean_title = self.clean_filename(title)
-            year, month, day = self.extract_year_month_day(publish_date)
-
-            if year is None:
-                year = 0
-            if month is None:
-                month = 0
-            if day is not None:
-                filename = f"{year:02}-{month:02}-{day:02} {clean_title}.json"
-            else:
-                filename = f"{year:02}-{month:02} {clean_title}.json"
-
-            save_directory = os.path.join(self.base_archive_directory, self.source_name, str(year), str(month))
-            os.makedirs(save_directory, exist_ok=True)
-
             article_json = {
+                'url': article.url,
                 'title': article.title,
                 'text': article.text,
                 'publish_date': article.publish_date.isoformat() if article.publish_date else None,
@@ -94,43 +70,138 @@ class ArticleDownloader:
                 'summary': article.summary,
                 'meta_site_name': article.meta_site_name
             }
-            save_path = os.path.join(save_directory, filename)
-            with open(save_path, 'w', encoding='utf-8') as f:
-                f.write(json.dumps(article_json, indent=4))
-                logging.info(f"Article saved to {save_path}")
+            return save_article_data(article_json, self.source_name, self.base_archive_directory, self.os_type, self.store,
+                                     self.catalog, self.category, self.file_compression, self.dedupe_content,
+                                     self.search_index)
         except Exception as e:
             logging.error(f"Failed to save article: {e}")
 
     # Function to process a single URL
-    def process_url(self, url):
+    def process_url(self, url, html=None):
         try:
-            logging.info(f"Processing URL: {url}")
+            logging.debug(f"Processing URL: {url}")
             article = Article(url)
-            article.download()
+            if html is None:
+                download_article(article, self.controller)
+            else:
+                article.download(input_html=html)
             article.parse()
-            article.nlp()
-            self.save_article(article)
+            if self.run_nlp:
+                article.nlp()
+            if self.save_article(article) is not None:
+                self.seen_index.add(url)
+        except Exception as e:
+            logging.error(f"Error downloading article from {url}: {e}")
+
+    # Function to parse and save an article fetched by the async engine
+    def process_fetched(self, url, fetch_future, position, in_flight):
+        try:
+            self.process_url(url, fetch_future.result())
         except Exception as e:
             logging.error(f"Error downloading article from {url}: {e}")
+        finally:
+            self.finish(position, in_flight)
 
-    # Main function to download articles from URLs concurrently
+    # Function to release an in-flight slot and record the URL's position as done
+    def finish(self, position, in_flight):
+        self.progress.complete(position)
+        in_flight.release()
+
+    # Main function to stream URLs through a bounded number of concurrent downloads
     def download_articles(self):
-        if self.urls:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                futures = [executor.submit(self.process_url, url) for url in self.urls]
-                concurrent.futures.wait(futures)
-        else:
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        submitted = skipped = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for position, url in self.iter_urls():
+                if position < self.progress.resume_position:
+                    continue
+                if url in self.seen_index:
+                    self.progress.complete(position)
+                    skipped += 1
+                    continue
+                in_flight.acquire()
+                submitted += 1
+                if self.fetcher is None:
+                    future = executor.submit(self.process_url, url)
+                    future.add_done_callback(lambda _, position=position: self.finish(position, in_flight))
+                else:
+                    # Downloads stay on the event loop; only parsing and saving use the thread pool.
+                    fetch_future = self.fetcher.submit(url)
+                    fetch_future.add_done_callback(
+                        lambda future, url=url, position=position: executor.submit(self.process_fetched, url, future, position, in_flight)
+                    )
+            for _ in range(self.max_in_flight):
+                in_flight.acquire()
+        if self.fetcher is not None:
+            self.fetcher.close()
+        if self.controller is not None:
+            self.controller.stop_export()
+        self.progress.save()
+        if submitted == 0 and skipped == 0:
             logging.error("No URLs to process.")
+        logging.info(f"Downloaded {submitted} URLs, skipped {skipped} already archived")
+
+
+class ProgressTracker:
+    """Persist how far through the URL list a run has got, despite out-of-order completion.
+
+    ``resume_position`` is the first position not known to be finished; every
+    position below it is done. Positions completed ahead of it are held in a set
+    that never grows beyond the number of tasks in flight.
+    """
+
+    def __init__(self, progress_path, save_every=100):
+        self.progress_path = progress_path
+        self.save_every = save_every
+        self.resume_position = 0
+        self._completed = set()
+        self._since_save = 0
+        self._lock = threading.Lock()
+        if os.path.exists(progress_path):
+            with open(progress_path, 'r') as f:
+                content = f.read().strip()
+                self.resume_position = int(content) if content.isdigit() else 0
+            logging.info(f"Resuming URL list from position {self.resume_position}")
+
+    def complete(self, position):
+        with self._lock:
+            if position < self.resume_position:
+                return
+            self._completed.add(position)
+            while self.resume_position in self._completed:
+                self._completed.remove(self.resume_position)
+                self.resume_position += 1
+            self._since_save += 1
+            if self._since_save >= self.save_every:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        temporary_path = f"{self.progress_path}.tmp"
+        with open(temporary_path, 'w') as f:
+            f.write(str(self.resume_position))
+        os.replace(temporary_path, self.progress_path)
+        self._since_save = 0
+
 
 if __name__ == "__main__":
 
 
 
     config = {
-        "urls_file_path": "../scripts/urls.txt",  # Path to the file containing URLs
+        "urls_file_path": "../scripts/urls.txt",  # Path to a file of URLs, or a harvester links.sqlite3
+        "harvest_source": "washington_examiner",  # Source to read from a link store (ignored for text files)
         "base_archive_directory": "/mnt/nas/data/archive/news",  # Base directory to save the downloaded articles
         "source_name": "washingtonexaminer",  # Manually set source folder name
-        "max_workers": 5  # Number of threads to use for downloading articles
+        "max_workers": 5,  # Number of threads to use for downloading articles
+        "fetch_engine": "async",  # 'async' fetches with the asyncio engine, 'newspaper' uses article.download()
+        "fetch_concurrency": 200,  # Requests in flight across all hosts
+        "fetch_per_host_concurrency": 8,  # Requests in flight per host
+        "max_in_flight": 1000,  # URLs read ahead of completed downloads; bounds memory for any list length
+        "nlp_during_crawl": True,  # False skips keywords/summary while downloading; run enrich.py afterwards to fill them in
     }
 
     downloader = ArticleDownloader(config)
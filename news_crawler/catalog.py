@@ -0,0 +1,207 @@
+import argparse
+import concurrent.futures
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import tldextract
+
+from archive_store import iter_archive, reference_path
+
+COLUMNS = ('url', 'source', 'category', 'publish_date', 'title', 'path', 'content_hash', 'crawled_at')
+
+
+def content_hash(text):
+    """Hash of the article body with case and whitespace normalized away."""
+    normalized = re.sub(r'\s+', ' ', text or '').strip().lower()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def source_categories(config):
+    """Map the directory name each source is archived under to its configured category."""
+    return {
+        tldextract.extract(source['base_url']).domain: source.get('category')
+        for source in config.get('news_sources', {}).values()
+    }
+
+
+class ArchiveCatalog:
+    """SQLite catalog of archived articles, indexed for date, source and category lookups."""
+
+    def __init__(self, catalog_path):
+        self.catalog_path = str(catalog_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.catalog_path)), exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        connection = self._connection()
+        connection.executescript('''
+            CREATE TABLE IF NOT EXISTS articles (
+                url TEXT PRIMARY KEY,
+                source TEXT,
+                category TEXT,
+                publish_date TEXT,
+                title TEXT,
+                path TEXT,
+                content_hash TEXT,
+                crawled_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS articles_publish_date ON articles (publish_date);
+            CREATE INDEX IF NOT EXISTS articles_source_date ON articles (source, publish_date);
+            CREATE INDEX IF NOT EXISTS articles_category_date ON articles (category, publish_date);
+            CREATE INDEX IF NOT EXISTS articles_content_hash ON articles (content_hash);
+            CREATE INDEX IF NOT EXISTS articles_path ON articles (path);
+        ''')
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.catalog_path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def make_row(article_data, source_name, category, path, crawled_at=None):
+        return (
+            article_data.get('url') or path,
+            source_name,
+            category,
+            article_data.get('publish_date'),
+            article_data.get('title'),
+            path,
+            content_hash(article_data.get('text')),
+            crawled_at or datetime.now().isoformat(timespec='seconds'),
+        )
+
+    def add(self, article_data, source_name, category, path):
+        self.add_rows([self.make_row(article_data, source_name, category, path)])
+
+    def add_rows(self, rows):
+        with self._write_lock:
+            connection = self._connection()
+            connection.executemany(
+                f"INSERT OR REPLACE INTO articles ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows
+            )
+            connection.commit()
+
+    def path_for_content_hash(self, text_hash, exclude_url=None):
+        """Path of the earliest catalogued article with this content hash, other than ``exclude_url``."""
+        row = self._connection().execute(
+            "SELECT path FROM articles WHERE content_hash = ? AND url IS NOT ? ORDER BY crawled_at LIMIT 1",
+            (text_hash, exclude_url),
+        ).fetchone()
+        return row[0] if row else None
+
+    def rename_paths(self, renames):
+        """Point catalogued articles at their new paths after ``(old_path, new_path)`` renames."""
+        with self._write_lock:
+            connection = self._connection()
+            connection.executemany("UPDATE articles SET path = ? WHERE path = ?", [(new, old) for old, new in renames])
+            connection.commit()
+
+    def _paths(self, where, parameters):
+        rows = self._connection().execute(
+            f"SELECT path FROM articles WHERE {where} ORDER BY publish_date, path", parameters
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def by_date(self, date):
+        # publish_date is ISO text, so every timestamp on a day sorts between 'date' and 'date~'.
+        return self._paths("publish_date >= ? AND publish_date < ?", (date, f"{date}~"))
+
+    def by_date_range(self, start_date, end_date, source=None, category=None):
+        where, parameters = "publish_date >= ? AND publish_date < ?", [start_date, f"{end_date}~"]
+        if source is not None:
+            where += " AND source = ?"
+            parameters.append(source)
+        if category is not None:
+            where += " AND category = ?"
+            parameters.append(category)
+        return self._paths(where, parameters)
+
+    def by_source(self, source):
+        return self._paths("source = ?", (source,))
+
+    def by_category(self, category):
+        return self._paths("category = ?", (category,))
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+
+def catalog_path(settings, base_archive_directory):
+    """Where the catalog lives: ``catalog_file``, defaulting to one inside the archive."""
+    return settings.get('catalog_file') or os.path.join(base_archive_directory, '.catalog.sqlite3')
+
+
+def open_catalog(settings, base_archive_directory):
+    """Open the catalog named by ``catalog_file``, defaulting to one inside the archive."""
+    return ArchiveCatalog(catalog_path(settings, base_archive_directory))
+
+
+def open_existing_catalog(settings, base_archive_directory):
+    """Open the catalog if it has been built, or return None when it is missing or empty.
+
+    Opening a missing catalog creates an empty one, whose queries would find
+    nothing in an archive that was never catalogued; readers fall back to
+    scanning the archive instead, or ask for ``python catalog.py`` to build it.
+    """
+    if not os.path.exists(catalog_path(settings, base_archive_directory)):
+        return None
+    catalog = open_catalog(settings, base_archive_directory)
+    return catalog if catalog.count() else None
+
+
+def catalog_rows_for_source(source_directory, category):
+    source_name = os.path.basename(source_directory)
+    rows = []
+    for reference, article_data in iter_archive(source_directory):
+        crawled_at = datetime.fromtimestamp(os.path.getmtime(reference_path(reference))).isoformat(timespec='seconds')
+        rows.append(ArchiveCatalog.make_row(article_data, source_name, category, reference, crawled_at))
+    return rows
+
+
+def rebuild_catalog(catalog, base_archive_directory, categories=None, workers=4):
+    """Index an existing archive, reading one source directory per worker process."""
+    categories = categories or {}
+    sources = sorted(
+        name for name in os.listdir(base_archive_directory)
+        if os.path.isdir(os.path.join(base_archive_directory, name)) and not name.startswith('.')
+    )
+    total = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(catalog_rows_for_source, os.path.join(base_archive_directory, name), categories.get(name)): name
+            for name in sources
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                rows = future.result()
+                catalog.add_rows(rows)
+                total += len(rows)
+                logging.info(f"Catalogued {len(rows)} articles for {futures[future]}")
+            except Exception as e:
+                logging.error(f"Error cataloguing {futures[future]}: {e}", exc_info=True)
+    logging.info(f"Catalog rebuilt with {total} articles from {len(sources)} sources")
+    return total
+
+
+if __name__ == "__main__":
+    from config_handler import ConfigHandler
+
+    parser = argparse.ArgumentParser(description='Rebuild the archive catalog from an existing archive.')
+    parser.add_argument('--config', type=str, default=str(Path(__file__).resolve().parent.parent / 'config.yml'), help='Path to the configuration file (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=4, help='Source directories read in parallel (default: %(default)s)')
+    args = parser.parse_args()
+
+    config = ConfigHandler(args.config).load_config()
+    base_archive_directory = config['settings']['base_archive_dir']
+    rebuild_catalog(open_catalog(config['settings'], base_archive_directory), base_archive_directory,
+                    source_categories(config), args.workers)
@@ -0,0 +1,287 @@
+import argparse
+import concurrent.futures
+import json
+import logging
+import os
+import re
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from archive_store import SHARD_EXTENSIONS, is_article_file, iter_shard, load_article
+from catalog import source_categories
+from enrich import EnrichmentStore, needs_enrichment
+
+STATE_FILE = '_export_state.json'
+SHARD_PATTERN = re.compile(r'^(\d+)(' + '|'.join(re.escape(extension) for extension in SHARD_EXTENSIONS.values()) + r')$')
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("The columnar export needs pyarrow: pip install pyarrow")
+
+
+def article_schema():
+    return pa.schema([
+        ('url', pa.string()),
+        ('title', pa.string()),
+        ('text', pa.string()),
+        ('summary', pa.string()),
+        ('publish_date', pa.timestamp('us')),
+        ('authors', pa.list_(pa.string())),
+        ('keywords', pa.list_(pa.string())),
+        ('top_image', pa.string()),
+        ('meta_site_name', pa.string()),
+        ('category', pa.string()),
+        ('path', pa.string()),
+    ])
+
+
+def parse_publish_date(value):
+    """ISO publish date as naive UTC, or None; mixed offsets in the archive must share one timestamp type."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _string_list(value):
+    if isinstance(value, str):
+        return [value]
+    return [str(item) for item in value if item is not None] if value else []
+
+
+def find_partitions(base_archive_directory):
+    """Map ``(source, year, month)`` to the month directory and/or shard holding its articles."""
+    partitions = {}
+    for source in sorted(os.listdir(base_archive_directory)):
+        source_directory = os.path.join(base_archive_directory, source)
+        if source.startswith('.') or not os.path.isdir(source_directory):
+            continue
+        for year in sorted(os.listdir(source_directory)):
+            year_directory = os.path.join(source_directory, year)
+            if not os.path.isdir(year_directory):
+                continue
+            for entry in sorted(os.listdir(year_directory)):
+                path = os.path.join(year_directory, entry)
+                match = SHARD_PATTERN.match(entry)
+                if match:
+                    partitions.setdefault((source, year, match.group(1)), []).append(path)
+                elif os.path.isdir(path):
+                    partitions.setdefault((source, year, entry), []).append(path)
+    return partitions
+
+
+def signature(inputs, sidecar=None):
+    """Cheap change marker for a partition: a month directory's mtime moves whenever a file in it is
+    created, replaced (saves are atomic renames) or removed, and a shard's whenever it is appended to.
+    Sidecar enrichment changes neither, so the time its references were last enriched is included."""
+    marks = []
+    for path in inputs:
+        status = os.stat(path)
+        mark = [status.st_mtime_ns, status.st_size if os.path.isfile(path) else 0]
+        if sidecar is not None:
+            mark.append(sidecar.latest_enrichment(os.path.join(path, '') if os.path.isdir(path) else f"{path}#"))
+        marks.append(mark)
+    return marks
+
+
+def partition_directory(export_directory, source, year, month):
+    return os.path.join(export_directory, f"source={source}", f"year={year}", f"month={month}")
+
+
+def iter_inputs(inputs):
+    for path in inputs:
+        if os.path.isdir(path):
+            for file in sorted(os.listdir(path)):
+                if is_article_file(file):
+                    reference = os.path.join(path, file)
+                    try:
+                        yield reference, load_article(reference)
+                    except Exception as e:
+                        logging.error(f"Failed to read '{reference}': {e}", exc_info=True)
+        else:
+            yield from iter_shard(path)
+
+
+def export_partition(inputs, output_directory, category=None, sidecar_path=None):
+    """Rewrite one source month as a single Parquet file; runs in a worker process and returns the row count."""
+    sidecar = EnrichmentStore(sidecar_path) if sidecar_path and os.path.exists(sidecar_path) else None
+    columns = {name: [] for name in article_schema().names}
+    for reference, article_data in iter_inputs(inputs):
+        if sidecar is not None and needs_enrichment(article_data):
+            article_data.update(sidecar.get(reference) or {})
+        columns['url'].append(article_data.get('url') or reference)
+        columns['title'].append(article_data.get('title'))
+        columns['text'].append(article_data.get('text'))
+        columns['summary'].append(article_data.get('summary'))
+        columns['publish_date'].append(parse_publish_date(article_data.get('publish_date')))
+        columns['authors'].append(_string_list(article_data.get('authors')))
+        columns['keywords'].append(_string_list(article_data.get('keywords')))
+        columns['top_image'].append(article_data.get('top_image'))
+        columns['meta_site_name'].append(article_data.get('meta_site_name'))
+        columns['category'].append(category)
+        columns['path'].append(reference)
+    table = pa.table(columns, schema=article_schema())
+    os.makedirs(output_directory, exist_ok=True)
+    output_path = os.path.join(output_directory, 'part-0.parquet')
+    temporary_path = f"{output_path}.tmp"
+    pq.write_table(table, temporary_path, compression='zstd', row_group_size=50_000)
+    os.replace(temporary_path, output_path)
+    return table.num_rows
+
+
+def load_state(export_directory):
+    try:
+        with open(os.path.join(export_directory, STATE_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(export_directory, state):
+    path = os.path.join(export_directory, STATE_FILE)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(temporary_path, path)
+
+
+def export_archive(base_archive_directory, export_directory, categories=None, workers=4, sidecar_path=None, full=False):
+    """Export the archive to Parquet partitioned by source/year/month, redoing only months changed since the last run.
+
+    A changed month is rewritten whole from the archive, so re-saved and
+    removed articles are reflected without duplicates. Months that vanished
+    from the archive (for example after re-dating) are dropped from the export.
+    """
+    _require_pyarrow()
+    categories = categories or {}
+    os.makedirs(export_directory, exist_ok=True)
+    state = load_state(export_directory)
+    partitions = find_partitions(base_archive_directory)
+    sidecar = EnrichmentStore(sidecar_path) if sidecar_path and os.path.exists(sidecar_path) else None
+    current = {'/'.join(key): signature(inputs, sidecar) for key, inputs in partitions.items()}
+    changed = [key for key in partitions if full or state.get('/'.join(key)) != current['/'.join(key)]]
+    removed = [key for key in state if key not in current]
+    logging.info(f"Exporting {len(changed)} of {len(partitions)} source months; {len(removed)} removed")
+
+    for key in removed:
+        shutil.rmtree(partition_directory(export_directory, *key.split('/')), ignore_errors=True)
+        del state[key]
+
+    total = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(export_partition, partitions[key], partition_directory(export_directory, *key),
+                            categories.get(key[0]), sidecar_path): key
+            for key in changed
+        }
+        for number, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            key = futures[future]
+            try:
+                total += future.result()
+                state['/'.join(key)] = current['/'.join(key)]
+            except Exception as e:
+                logging.error(f"Error exporting {'/'.join(key)}: {e}", exc_info=True)
+            if number % 100 == 0:
+                # Checkpoint, so an interrupted export does not redo finished months.
+                save_state(export_directory, state)
+    save_state(export_directory, state)
+    logging.info(f"Exported {total} articles from {len(changed)} source months to {export_directory}")
+    return total
+
+
+class ColumnarArchive:
+    """Vectorized queries over the Parquet export, reading only the columns and partitions a query needs."""
+
+    def __init__(self, export_directory):
+        _require_pyarrow()
+        self.export_directory = str(export_directory)
+
+    def dataset(self):
+        return ds.dataset(self.export_directory, format='parquet', partitioning='hive',
+                          exclude_invalid_files=True, ignore_prefixes=['_', '.'])
+
+    @staticmethod
+    def _filter(start_date=None, end_date=None, source=None, category=None):
+        expression = None
+        conditions = []
+        if start_date is not None:
+            conditions.append(ds.field('publish_date') >= pa.scalar(datetime.fromisoformat(start_date), pa.timestamp('us')))
+        if end_date is not None:
+            end = datetime.fromisoformat(end_date)
+            end = end.replace(hour=23, minute=59, second=59, microsecond=999999) if len(end_date) <= 10 else end
+            conditions.append(ds.field('publish_date') <= pa.scalar(end, pa.timestamp('us')))
+        if source is not None:
+            conditions.append(ds.field('source') == source)
+        if category is not None:
+            conditions.append(ds.field('category') == category)
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def read(self, columns, start_date=None, end_date=None, source=None, category=None):
+        return self.dataset().to_table(columns=columns, filter=self._filter(start_date, end_date, source, category))
+
+    def counts_per_source_per_day(self, start_date=None, end_date=None, source=None, category=None):
+        """Table of ``source, day, articles`` sorted by source and day.
+
+        Days are UTC days: publish dates are stored in UTC, so an article
+        published at ``2024-01-05T22:30-05:00`` counts on 2024-01-06.
+        """
+        table = self.read(['source', 'publish_date'], start_date, end_date, source, category)
+        table = table.append_column('day', pc.cast(table['publish_date'], pa.date32())).drop_columns(['publish_date'])
+        counts = table.group_by(['source', 'day']).aggregate([([], 'count_all')])
+        return counts.rename_columns(['source', 'day', 'articles']).sort_by([('source', 'ascending'), ('day', 'ascending')])
+
+    def keyword_frequency(self, keywords=None, period='month', start_date=None, end_date=None, source=None, category=None):
+        """Table of ``period, keyword, articles``: how many articles carry each keyword per day, month or year.
+
+        Without ``keywords`` every keyword is counted. Matching is case-insensitive.
+        """
+        formats = {'day': '%Y-%m-%d', 'month': '%Y-%m', 'year': '%Y'}
+        if period not in formats:
+            raise ValueError(f"period must be one of {', '.join(formats)}")
+        table = self.read(['publish_date', 'keywords'], start_date, end_date, source, category)
+        flat = pc.utf8_lower(pc.list_flatten(table['keywords']))
+        periods = pc.take(pc.strftime(table['publish_date'], format=formats[period]), pc.list_parent_indices(table['keywords']))
+        exploded = pa.table({'period': periods, 'keyword': flat})
+        if keywords is not None:
+            exploded = exploded.filter(pc.is_in(exploded['keyword'], value_set=pa.array([keyword.lower() for keyword in keywords])))
+        counts = exploded.group_by(['period', 'keyword']).aggregate([([], 'count_all')])
+        return counts.rename_columns(['period', 'keyword', 'articles']).sort_by([('period', 'ascending'), ('articles', 'descending')])
+
+
+def open_columnar_archive(settings, base_archive_directory):
+    return ColumnarArchive(settings.get('columnar_dir') or os.path.join(base_archive_directory, '.columnar'))
+
+
+if __name__ == "__main__":
+    from config_handler import ConfigHandler
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Export the archive to Parquet partitioned by source/year/month.')
+    parser.add_argument('--config', type=str, default=str(Path(__file__).resolve().parent.parent / 'config.yml'), help='Path to the configuration file (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='Source months exported in parallel (default: %(default)s)')
+    parser.add_argument('--full', action='store_true', help='Re-export every month instead of only those changed since the last run')
+    args = parser.parse_args()
+
+    config = ConfigHandler(args.config).load_config()
+    settings = config['settings']
+    base_archive_directory = settings['base_archive_dir']
+    sidecar_path = settings.get('enrichment_file') or os.path.join(base_archive_directory, '.enrichment.sqlite3')
+    export_archive(base_archive_directory, settings.get('columnar_dir') or os.path.join(base_archive_directory, '.columnar'),
+                   source_categories(config), args.workers, sidecar_path, args.full)
@@ -1,10 +1,13 @@
 import yaml
+import json
 import logging
+import os
 from datetime import datetime, date
-import sys
 from pathlib import Path
 import argparse
 
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 # Configure logging
 logging.basicConfig(
     level=logging.DEBUG,
@@ -15,23 +18,103 @@ logging.basicConfig(
     ]
 )
 
+class NewsSource:
+    """A validated ``news_sources`` entry."""
+
+    def __init__(self, name, base_url, category=None, failed=False):
+        self.name = name
+        self.base_url = base_url
+        self.category = category
+        self.failed = failed
+
+    @classmethod
+    def from_config(cls, name, details):
+        if not isinstance(details, dict):
+            raise ValueError(f"Source {name} must be a mapping")
+        base_url = details.get('base_url')
+        if not isinstance(base_url, str) or not base_url.startswith(('http://', 'https://')):
+            raise ValueError(f"Source {name} has no valid base_url: {base_url!r}")
+        return cls(name, base_url, details.get('category'), bool(details.get('failed', False)))
+
+
+def load_sources(config):
+    """Return the configured sources as NewsSource records, skipping (and logging) invalid entries."""
+    sources = []
+    for name, details in (config.get('news_sources') or {}).items():
+        try:
+            sources.append(NewsSource.from_config(name, details))
+        except ValueError as e:
+            logging.error(f"Ignoring invalid news source: {e}")
+    return sources
+
+
 class ConfigHandler:
     def __init__(self, config_path):
         self.config_path = Path(config_path)
+        self.cache_path = self.config_path.with_name(f".{self.config_path.name}.cache")
         self.config = None
+        self.signature = None
+
+    def _signature(self):
+        stat = self.config_path.stat()
+        return stat.st_mtime_ns, stat.st_size
 
     def load_config(self):
-        """Load the configuration file."""
+        """Load and validate the configuration file, reusing the parsed form cached for an unchanged file."""
         try:
-            with self.config_path.open('r') as file:
-                self.config = yaml.safe_load(file)
-            self.validate_config(self.config)
-            logging.info(f"Loaded configuration from {self.config_path}")
+            signature = self._signature()
+            config = self._read_cache(signature)
+            if config is None:
+                with self.config_path.open('r') as file:
+                    config = yaml.load(file, Loader=SafeLoader)
+                self.validate_config(config)
+                self._write_cache(signature, config)
+                logging.info(f"Loaded configuration from {self.config_path}")
+            self.config, self.signature = config, signature
             return self.config  # Ensure the method returns the loaded config
         except Exception as e:
             logging.error(f"Error loading configuration file: {e}")
             raise
 
+    def _read_cache(self, signature):
+        try:
+            with self.cache_path.open('r', encoding='utf-8') as file:
+                return self._from_cache_text(file.read(), signature)
+        except Exception:
+            return None
+
+    def _from_cache_text(self, text, signature):
+        cached = json.loads(text)
+        if tuple(cached['signature']) != tuple(signature):
+            return None
+        # Dates are cached as ISO strings; validating again turns them back into dates.
+        config = cached['config']
+        self.validate_config(config)
+        return config
+
+    def _write_cache(self, signature, config):
+        try:
+            text = json.dumps({'signature': signature, 'config': config}, default=lambda value: value.isoformat())
+            if self._from_cache_text(text, signature) != config:
+                # Something JSON can't hold exactly, such as a non-string key; parse the YAML every time instead.
+                return
+            temporary_path = self.cache_path.with_name(f"{self.cache_path.name}.tmp")
+            with temporary_path.open('w', encoding='utf-8') as file:
+                file.write(text)
+            os.replace(temporary_path, self.cache_path)
+        except Exception as e:
+            logging.debug(f"Could not cache parsed configuration: {e}")
+
+    def reload_if_changed(self):
+        """Return the freshly loaded configuration if the file changed since the last load, otherwise None."""
+        try:
+            if self._signature() == self.signature:
+                return None
+            return self.load_config()
+        except Exception as e:
+            logging.error(f"Keeping the current configuration; reload failed: {e}")
+            return None
+
     @staticmethod
     def validate_config(config, parent_key=''):
         for key, value in config.items():
@@ -44,11 +127,15 @@ class ConfigHandler:
                 try:
                     config[key] = ConfigHandler.validate_date(value)
                 except ValueError as e:
-                    logging.error(f"Invalid date format for key: {full_key}, value: {value}")
-                    sys.exit(1)
+                    # Raised rather than exiting, so a bad hot reload keeps the current configuration.
+                    raise ValueError(f"Invalid date format for key: {full_key}, value: {value}") from e
 
     @staticmethod
     def validate_date(date_str):
+        try:
+            return date.fromisoformat(date_str)
+        except ValueError:
+            pass
         date_formats = [
             '%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y', '%d/%m/%Y',
             '%Y/%m/%d', '%B %d, %Y', '%d %B %Y'
@@ -64,37 +151,46 @@ class ConfigHandler:
     def save_config(self):
         """Save the configuration file, ensuring news_sources is the last key."""
         try:
-            if 'news_sources' in self.config:
-                news_sources = self.config.pop('news_sources')
+            config = dict(self.config)
+            if 'news_sources' in config:
+                news_sources = config.pop('news_sources')
                 with self.config_path.open('w') as file:
-                    yaml.safe_dump(self.config, file, sort_keys=False)
+                    yaml.safe_dump(config, file, sort_keys=False)
                     yaml.safe_dump({'news_sources': news_sources}, file, sort_keys=False)
             else:
                 with self.config_path.open('w') as file:
-                    yaml.safe_dump(self.config, file, sort_keys=False)
+                    yaml.safe_dump(config, file, sort_keys=False)
+            self.signature = self._signature()
+            self._write_cache(self.signature, self.config)
             logging.info(f"Configuration saved to {self.config_path}")
         except Exception as e:
             logging.error(f"Failed to save configuration file: {e}")
             raise
 
     def remove_duplicates_and_sort(self):
-        """Remove duplicates and sort the news sources by their names."""
+        """Remove duplicates and sort the news sources by their names; return True if anything changed."""
         if 'news_sources' in self.config:
             news_sources = self.config['news_sources']
             unique_news_sources = {source: details for source, details in news_sources.items()}
             sorted_news_sources = dict(sorted(unique_news_sources.items(), key=lambda item: item[0].lower()))
+            if list(sorted_news_sources) == list(news_sources):
+                return False
             self.config['news_sources'] = sorted_news_sources
             logging.info("Removed duplicates and sorted news sources alphabetically by name")
+            return True
+        return False
 
     def process_config(self):
-        """Process the configuration file."""
+        """Load the configuration once, rewriting config.yml only if sorting the sources changed it."""
         try:
             self.load_config()
-            self.remove_duplicates_and_sort()
-            self.save_config()
+            if self.remove_duplicates_and_sort():
+                self.save_config()
             logging.info(f"Successfully processed the configuration file at {self.config_path}")
         except Exception as e:
             logging.error(f"An error occurred: {e}")
+            raise
+        return self.config
 
 def main(config_file_path):
     """Main function to process the configuration file."""
@@ -0,0 +1,135 @@
+import logging
+import os
+import threading
+
+
+class CycleJournal:
+    """Write-ahead journal of the crawl cycle in progress, so an interrupted cycle resumes where it stopped.
+
+    A cycle starts by writing its shuffled source list. Every built source is
+    then journalled together with the article links it yielded before those
+    links are downloaded, and every saved article is journalled as it is saved.
+    After a crash or restart the cycle is picked up again: built sources are not
+    rebuilt, their unsaved links are fed straight to the download stage, and
+    the remaining sources are built in their original order. Lines are
+    tab-separated; a torn last line from a crash is ignored.
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = str(journal_path)
+        self.cycle = None
+        self.first_run = True
+        self.sources = []
+        self.built = set()
+        self.found = {}
+        self.saved = set()
+        self.finished = True
+        self._file = None
+        self._lock = threading.Lock()
+        self.load()
+
+    @property
+    def resumable(self):
+        return not self.finished and self.cycle is not None
+
+    @property
+    def active(self):
+        return self._file is not None
+
+    def load(self):
+        if not os.path.exists(self.journal_path):
+            return
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break
+                    self._apply(line.rstrip('\n').split('\t'))
+        except Exception as e:
+            logging.error(f"Failed to load cycle journal {self.journal_path}: {e}", exc_info=True)
+            self.finished = True
+
+    def _apply(self, fields):
+        event = fields[0]
+        if event == 'cycle':
+            self.cycle, self.first_run, self.finished = int(fields[1]), fields[2] == '1', False
+        elif event == 'source':
+            self.sources.append(fields[1])
+        elif event == 'found':
+            self.found.setdefault(fields[1], []).append(fields[2])
+        elif event == 'built':
+            self.built.add(fields[1])
+        elif event == 'saved':
+            self.saved.add(fields[1])
+        elif event == 'end':
+            self.finished = True
+
+    def _write(self, lines, sync=False):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.writelines(f"{line}\n" for line in lines)
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def start(self, cycle, first_run, source_urls):
+        """Begin a new cycle over ``source_urls``, replacing the journal of the previous one."""
+        temporary_path = f"{self.journal_path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            f.write(f"cycle\t{cycle}\t{int(first_run)}\n")
+            f.writelines(f"source\t{url}\n" for url in source_urls)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, self.journal_path)
+        self.cycle, self.first_run, self.finished = cycle, first_run, False
+        self.sources, self.built, self.found, self.saved = list(source_urls), set(), {}, set()
+        self._open()
+
+    def resume(self):
+        """Reopen an unfinished cycle for appending; returns its sources, built ones with pending links first."""
+        self._open()
+        pending = [url for url in self.sources if url in self.built and self.pending(url)]
+        remaining = [url for url in self.sources if url not in self.built]
+        logging.info(f"Resuming cycle {self.cycle}: {len(self.built)} of {len(self.sources)} sources built, "
+                     f"{sum(len(self.pending(url)) for url in pending)} articles pending")
+        return pending + remaining
+
+    def _open(self):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.journal_path, 'a', encoding='utf-8')
+
+    def is_built(self, source_url):
+        return self.active and source_url in self.built
+
+    def pending(self, source_url):
+        return [url for url in self.found.get(source_url, []) if url not in self.saved]
+
+    def record_built(self, source_url, article_urls):
+        if not self.active:
+            return
+        self.built.add(source_url)
+        self._write([f"found\t{source_url}\t{url}" for url in article_urls] + [f"built\t{source_url}"], sync=True)
+
+    def record_saved(self, url):
+        # Not synced: the seen index also catches articles saved just before a crash.
+        self._write([f"saved\t{url}"])
+
+    def finish(self):
+        self._write(['end'], sync=True)
+        self.finished = True
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def create_cycle_journal(settings, base_archive_directory):
+    """Return a CycleJournal, or None when ``cycle_journal_enabled`` is off."""
+    if not settings.get('cycle_journal_enabled', True):
+        return None
+    return CycleJournal(settings.get('cycle_journal_file') or os.path.join(base_archive_directory, '.cycle.journal'))
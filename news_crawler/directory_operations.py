@@ -1,14 +1,26 @@
+import errno
+import gzip
+import json
 import logging
 import os
 import re
+import tempfile
 from unidecode import unidecode
 from datetime import datetime
+from archive_store import ARTICLE_EXTENSIONS, is_shard, load_article, reference_path
+from catalog import content_hash
+
+EMPTY_CONTENT_HASH = content_hash('')
+
+# mkstemp creates files private to the owner; articles get the permissions a plain open() would give them.
+UMASK = os.umask(0)
+os.umask(UMASK)
 
 def extract_year_month_day(timestamp):
     try:
         logging.debug(f"Extracting year, month, and day from timestamp: {timestamp}")
         if isinstance(timestamp, str):
-            dt = datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S")
+            dt = datetime.fromisoformat(timestamp)
         elif isinstance(timestamp, datetime):
             dt = timestamp
         else:
@@ -53,7 +65,7 @@ def clean_filename(title, os_type='Windows'):
             # Apply max length restriction for Windows
             title_clean = title_clean[:max_length]
 
-        logging.info(f"Cleaned filename: {title_clean} from: {title}")
+        logging.debug(f"Cleaned filename: {title_clean} from: {title}")
         return title_clean
     except Exception as e:
         logging.error(f"Error cleaning filename: {e}")
@@ -67,16 +79,143 @@ def create_directories(path):
             logging.debug(f"Directory already exists: {path}")
         else:
             os.makedirs(path, exist_ok=True)
-            logging.info(f"Directory created successfully: {path}")
+            logging.debug(f"Directory created successfully: {path}")
     except Exception as e:
         logging.error(f"An error occurred while creating directory: {path} - {e}")
         raise
 
 
-def save_article(article, source, base_archive_directory, os_type):
+def save_article(article, source, base_archive_directory, os_type, store=None, catalog=None, category=None,
+                 compression=None, dedupe='off', search_index=None):
+    try:
+        article_data = article.to_json(as_string=False)
+    except Exception as e:
+        logging.error(f"Failed to save article: {e}")
+        return None
+    return save_article_data(article_data, source.brand, base_archive_directory, os_type, store, catalog, category,
+                             compression, dedupe, search_index)
+
+
+def split_extension(filename):
+    """Split ``name.json`` or ``name.json.gz`` into the name and its (compound) extension."""
+    for extension in ARTICLE_EXTENSIONS[::-1]:
+        if filename.endswith(extension):
+            return filename[:-len(extension)], extension
+    return os.path.splitext(filename)
+
+
+def stored_url(path):
+    try:
+        return load_article(path).get('url')
+    except Exception:
+        return None
+
+
+def link_into_place(temporary_path, save_directory, filename, url):
+    """Give the finished ``temporary_path`` its final name and return that path.
+
+    A name is claimed by hard-linking the complete file to it, which fails if
+    the name is taken, so two save threads never pick the same one and nothing
+    appears under an article name before it is whole. A taken name is only
+    replaced when it holds the same URL, so two articles sharing a title and
+    date no longer overwrite each other; otherwise the next ``name (n)`` is
+    tried. The temporary name is gone afterwards.
+    """
+    stem, extension = split_extension(filename)
+    candidate = os.path.join(save_directory, filename)
+    number = 2
+    try:
+        while True:
+            try:
+                os.link(temporary_path, candidate)
+                return candidate
+            except FileExistsError:
+                if url is not None and stored_url(candidate) == url:
+                    os.replace(temporary_path, candidate)
+                    return candidate
+            except OSError as e:
+                if e.errno not in (errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP):
+                    raise
+                # No hard links on this filesystem: claim the name empty, then fill it at once.
+                try:
+                    os.close(os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                    os.replace(temporary_path, candidate)
+                    return candidate
+                except FileExistsError:
+                    if url is not None and stored_url(candidate) == url:
+                        os.replace(temporary_path, candidate)
+                        return candidate
+            candidate = os.path.join(save_directory, f"{stem} ({number}){extension}")
+            number += 1
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def compression_for(path):
+    """The ``write_atomically`` compression matching an article file's extension."""
+    return 'gzip' if path.endswith('.gz') else None
+
+
+def temporary_path_in(directory):
+    """A new, empty, uniquely named temporary file in ``directory``, where a rename or link to its final name is atomic."""
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    os.close(descriptor)
+    return temporary_path
+
+
+def write_temporary(directory, json_data, compression=None):
+    """Write ``json_data`` to a new temporary file in ``directory`` and return its path."""
+    temporary_path = temporary_path_in(directory)
+    try:
+        os.chmod(temporary_path, 0o666 & ~UMASK)
+        if compression == 'gzip':
+            with gzip.open(temporary_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+                f.write(json_data)
+        else:
+            with open(temporary_path, 'w', encoding='utf-8') as f:
+                f.write(json_data)
+        return temporary_path
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def write_atomically(path, json_data, compression=None):
+    """Write through a temporary file renamed into place, so a killed crawler never leaves a torn article."""
+    temporary_path = write_temporary(os.path.dirname(path) or '.', json_data, compression)
+    try:
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def find_duplicate_body(article_data, catalog):
+    """Path of an archived article with the same normalized text, or None."""
+    text_hash = content_hash(article_data.get('text'))
+    if catalog is None or text_hash == EMPTY_CONTENT_HASH:
+        return None
+    path = catalog.path_for_content_hash(text_hash, exclude_url=article_data.get('url'))
+    return path if path is not None and os.path.exists(reference_path(path)) else None
+
+
+def save_article_data(article_data, source_name, base_archive_directory, os_type, store=None, catalog=None, category=None,
+                      compression=None, dedupe='off', search_index=None):
+    """Save one article and return its path or shard reference, or None on failure.
+
+    With ``dedupe`` set to 'skip' or 'hardlink' and a catalog available, a body
+    already in the archive is not written again: the URL is catalogued against
+    the existing file, which 'hardlink' also links under the new article's name.
+    A linked file is the first article's JSON, so its url, title and other
+    metadata are that article's; only the catalog knows the new URL. Files are
+    only linked when both use the same extension and compression, otherwise
+    the article is written normally. Such duplicates are left out of
+    ``search_index``, which already has the body.
+    """
     try:
-        publish_date = article.publish_date
-        title = article.title
+        publish_date = article_data.get('publish_date')
+        title = article_data.get('title') or ''
         clean_title = clean_filename(title, os_type)
         year, month, day = extract_year_month_day(publish_date)
 
@@ -87,22 +226,52 @@ def save_article(article, source, base_archive_directory, os_type):
             logging.warning("Could not extract month from publish date")
             month = 0
 
+        duplicate_path = find_duplicate_body(article_data, catalog) if dedupe != 'off' else None
+        if duplicate_path is not None and (dedupe == 'skip' or store is not None or is_shard(reference_path(duplicate_path))):
+            logging.debug(f"Body of {article_data.get('url')} already archived at {duplicate_path}")
+            catalog.add(article_data, source_name, category, duplicate_path)
+            return duplicate_path
+
+        if store is not None:
+            save_path = store.append(article_data, source_name, year, month)
+            if catalog is not None:
+                catalog.add(article_data, source_name, category, save_path)
+            if search_index is not None:
+                search_index.add(article_data, source_name, category, save_path)
+            return save_path
+
+        extension = '.json.gz' if compression == 'gzip' else '.json'
         if day is not None:
-            filename = f"{year:02}-{month:02}-{day:02} {clean_title}.json"
+            filename = f"{year:02}-{month:02}-{day:02} {clean_title}{extension}"
         else:
-            filename = f"{year:02}-{month:02} {clean_title}.json"
+            filename = f"{year:02}-{month:02} {clean_title}{extension}"
 
-        save_directory = os.path.join(base_archive_directory, source.brand, str(year), str(month))
+        save_directory = os.path.join(base_archive_directory, source_name, str(year), str(month))
         create_directories(save_directory)
 
-        save_path = os.path.join(save_directory, filename)
-        json_data = article.to_json()
+        if duplicate_path is not None and split_extension(duplicate_path)[1] != extension:
+            duplicate_path = None
         try:
-            with open(save_path, 'w', encoding='utf-8') as f:
-                f.write(json_data)
-                logging.info(f"Article saved to {save_path}")
+            if duplicate_path is not None:
+                temporary_path = temporary_path_in(save_directory)
+                os.remove(temporary_path)
+                os.link(duplicate_path, temporary_path)
+            else:
+                temporary_path = write_temporary(save_directory, json.dumps(article_data, indent=4, ensure_ascii=False),
+                                                 compression)
+            save_path = link_into_place(temporary_path, save_directory, filename, article_data.get('url'))
+            if duplicate_path is not None:
+                logging.debug(f"Article {save_path} linked to identical body {duplicate_path}")
+            else:
+                logging.debug(f"Article saved to {save_path}")
+            if catalog is not None:
+                catalog.add(article_data, source_name, category, save_path)
+            if search_index is not None and duplicate_path is None:
+                search_index.add(article_data, source_name, category, save_path)
+            return save_path
         except Exception as e:
             logging.error(f"Error writing to file: {e}")
 
     except Exception as e:
-        logging.error(f"Failed to save article: {e}")
\ No newline at end of file
+        logging.error(f"Failed to save article: {e}")
+    return None
@@ -0,0 +1,225 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+from urllib.parse import urljoin
+
+import lxml.etree
+import lxml.html
+import requests
+
+from fetcher import DEFAULT_USER_AGENT
+
+FEED_TYPES = ('application/rss+xml', 'application/atom+xml')
+FEED_PATHS = ('/feed', '/rss', '/feed/rss', '/rss.xml', '/atom.xml')
+SITEMAP_PATHS = ('/news-sitemap.xml', '/sitemap_news.xml', '/sitemap-news.xml')
+MAX_CHILD_SITEMAPS = 3
+
+
+class DiscoveryResult:
+    """Outcome of checking one source.
+
+    ``unchanged`` means nothing needs doing this visit. Otherwise
+    ``article_urls`` holds the new links found in feeds or sitemaps, or is None
+    when the source has none and must be built from ``homepage_html``.
+    ``validators`` are the ETag/Last-Modified values of the pages read, to be
+    stored with ``FeedDiscovery.remember`` once the articles they led to are
+    processed; stored any earlier, a crash would turn the next visit into a
+    304 and those articles would never be seen again.
+    """
+
+    def __init__(self, unchanged=False, article_urls=None, homepage_html=None, validators=None):
+        self.unchanged = unchanged
+        self.article_urls = article_urls
+        self.homepage_html = homepage_html
+        self.validators = validators or []
+
+
+def parse_feed(content):
+    """Return ``(article_urls, child_sitemaps)`` from RSS, Atom, a sitemap or a sitemap index."""
+    root = lxml.etree.fromstring(content, parser=lxml.etree.XMLParser(recover=True, resolve_entities=False))
+    if root is None:
+        return [], []
+    article_urls = root.xpath("//*[local-name()='item']/*[local-name()='link']/text()")
+    article_urls += root.xpath("//*[local-name()='entry']/*[local-name()='link'][not(@rel) or @rel='alternate']/@href")
+    article_urls += root.xpath("//*[local-name()='url']/*[local-name()='loc']/text()")
+    children = []
+    for sitemap in root.xpath("//*[local-name()='sitemap']"):
+        location = sitemap.xpath("*[local-name()='loc']/text()")
+        modified = sitemap.xpath("*[local-name()='lastmod']/text()")
+        if location:
+            children.append((modified[0].strip() if modified else '', location[0].strip()))
+    # Index files list sitemaps oldest first on many sites; only the newest ones carry new articles.
+    children = [location for _, location in sorted(children, reverse=True)[:MAX_CHILD_SITEMAPS]]
+    return [url.strip() for url in article_urls if url and url.strip()], children
+
+
+class FeedDiscovery:
+    """Conditional-GET, feed-first article discovery for news sources.
+
+    ETag and Last-Modified validators are kept per URL, so an unchanged
+    homepage, feed or sitemap costs a 304 instead of a download. Feeds and news
+    sitemaps found on a source are remembered for ``refresh_hours``; when a
+    source has any, its article links come from them and the homepage and
+    category pages are never scraped.
+    """
+
+    def __init__(self, state_path, seen_index=None, controller=None, refresh_hours=24, timeout=30):
+        self.state_path = str(state_path)
+        self.seen_index = seen_index
+        self.controller = controller
+        self.refresh = refresh_hours * 3600
+        self.timeout = timeout
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        connection = self._connection()
+        connection.executescript('''
+            CREATE TABLE IF NOT EXISTS validators (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT);
+            CREATE TABLE IF NOT EXISTS feeds (source_url TEXT, feed_url TEXT, PRIMARY KEY (source_url, feed_url));
+            CREATE TABLE IF NOT EXISTS discovered (source_url TEXT PRIMARY KEY, discovered_at REAL);
+        ''')
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.state_path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers['User-Agent'] = DEFAULT_USER_AGENT
+            self._local.session = session
+        return session
+
+    def _write(self, query, parameters):
+        with self._write_lock:
+            connection = self._connection()
+            connection.executemany(query, parameters)
+            connection.commit()
+
+    def conditional_get(self, url, validators=None):
+        """Return ``(changed, content)``; ``changed`` is False on a 304 and content is None on errors.
+
+        The response's validators are appended to ``validators`` rather than
+        stored; without a list they are dropped, so probing a URL does not turn
+        the next real read of it into a 304.
+        """
+        stored = self._connection().execute(
+            "SELECT etag, last_modified FROM validators WHERE url = ?", (url,)
+        ).fetchone()
+        headers = {}
+        if stored is not None:
+            if stored[0]:
+                headers['If-None-Match'] = stored[0]
+            if stored[1]:
+                headers['If-Modified-Since'] = stored[1]
+        try:
+            with self.controller.request(url) if self.controller is not None else nullcontext() as outcome:
+                response = self._session().get(url, headers=headers, timeout=self.timeout)
+                if outcome is not None:
+                    outcome.status = response.status_code
+                    outcome.retry_after = response.headers.get('Retry-After')
+                if response.status_code >= 500 or response.status_code == 429:
+                    response.raise_for_status()
+        except Exception as e:
+            logging.debug(f"Conditional GET failed for {url}: {e}")
+            return True, None
+        if response.status_code == 304:
+            return False, None
+        if response.status_code >= 400:
+            return True, None
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if validators is not None and (etag or last_modified):
+            validators.append((url, etag, last_modified))
+        return True, response.content
+
+    def remember(self, validators):
+        """Store validators from a DiscoveryResult, so the next unchanged read of those pages is a 304."""
+        if validators:
+            self._write("INSERT OR REPLACE INTO validators VALUES (?, ?, ?)", validators)
+
+    def _known_feeds(self, source_url):
+        row = self._connection().execute(
+            "SELECT discovered_at FROM discovered WHERE source_url = ?", (source_url,)
+        ).fetchone()
+        if row is None or time.time() - row[0] > self.refresh:
+            return None
+        return [feed for (feed,) in self._connection().execute(
+            "SELECT feed_url FROM feeds WHERE source_url = ?", (source_url,))]
+
+    def _find_feeds(self, source_url, homepage_html):
+        """Look for feeds advertised on the homepage, then probe the usual feed and news sitemap paths."""
+        feeds = []
+        if homepage_html:
+            try:
+                document = lxml.html.fromstring(homepage_html)
+                for link in document.xpath('//link[@rel="alternate"][@href]'):
+                    if (link.get('type') or '').lower() in FEED_TYPES:
+                        feeds.append(urljoin(source_url, link.get('href')))
+            except Exception as e:
+                logging.debug(f"Could not read feed links from {source_url}: {e}")
+        if not feeds:
+            for path in FEED_PATHS + SITEMAP_PATHS:
+                candidate = urljoin(source_url, path)
+                changed, content = self.conditional_get(candidate)
+                if content and parse_feed(content) != ([], []):
+                    feeds.append(candidate)
+                    break
+        feeds = list(dict.fromkeys(feeds))
+        self._write("DELETE FROM feeds WHERE source_url = ?", [(source_url,)])
+        self._write("INSERT OR IGNORE INTO feeds VALUES (?, ?)", [(source_url, feed) for feed in feeds])
+        self._write("INSERT OR REPLACE INTO discovered VALUES (?, ?)", [(source_url, time.time())])
+        logging.info(f"Discovered {len(feeds)} feeds for {source_url}")
+        return feeds
+
+    def _read_feed(self, feed_url, validators, depth=0):
+        changed, content = self.conditional_get(feed_url, validators)
+        if not changed or content is None:
+            return []
+        article_urls, children = parse_feed(content)
+        if depth == 0:
+            for child in children:
+                article_urls += self._read_feed(child, validators, depth + 1)
+        return article_urls
+
+    def discover(self, source_url):
+        validators = []
+        feeds = self._known_feeds(source_url)
+        if not feeds:
+            changed, content = self.conditional_get(source_url, validators)
+            homepage_html = content.decode('utf-8', errors='replace') if content else None
+            if feeds is None:
+                feeds = self._find_feeds(source_url, homepage_html)
+            if not feeds:
+                if not changed:
+                    logging.debug(f"Homepage of {source_url} unchanged since last visit")
+                    return DiscoveryResult(unchanged=True)
+                return DiscoveryResult(homepage_html=homepage_html, validators=validators)
+
+        article_urls = []
+        for feed in feeds:
+            article_urls += self._read_feed(feed, validators)
+        article_urls = [urljoin(source_url, url) for url in dict.fromkeys(article_urls)]
+        if self.seen_index is not None:
+            article_urls = [url for url in article_urls if url not in self.seen_index]
+        logging.debug(f"{len(article_urls)} new article URLs from feeds of {source_url}")
+        return DiscoveryResult(unchanged=not article_urls, article_urls=article_urls, validators=validators)
+
+
+def create_discovery(settings, base_archive_directory, seen_index=None, controller=None):
+    """Return a FeedDiscovery, or None when ``discovery_enabled`` is false."""
+    if not settings.get('discovery_enabled', True):
+        return None
+    return FeedDiscovery(
+        settings.get('discovery_file') or os.path.join(base_archive_directory, '.discovery.sqlite3'),
+        seen_index,
+        controller,
+        settings.get('discovery_refresh_hours', 24),
+    )
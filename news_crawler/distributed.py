@@ -0,0 +1,224 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+
+from newspaper import Article, Source
+
+from work_queue import ARTICLE, SOURCE, create_work_queue
+
+# State files each node keeps for itself: SQLite in WAL mode needs shared memory that does not
+# work across machines, and JSON snapshots would be overwritten by every node.
+NODE_LOCAL_FILES = (
+    'archive_index_file', 'catalog_file', 'search_index_file', 'discovery_file', 'politeness_state_file',
+    'metrics_snapshot_file', 'source_health_file', 'schedule_state_file', 'cycle_journal_file', 'profile_output_file',
+)
+
+
+def node_state_directory(settings, base_archive_directory):
+    """Directory for a node's own state files: the archive itself when standalone, ``node_state_dir`` otherwise.
+
+    In coordinator and worker mode the archive is shared by every node, so
+    ``node_state_dir`` must name a directory local to this node, and none of
+    the state files may be configured inside the archive. The seen index,
+    catalog and search index then only cover what this node saved; rebuild
+    them from the shared archive with catalog.py and search_index.py.
+    """
+    mode = settings.get('crawl_mode', 'standalone')
+    if mode == 'standalone':
+        return base_archive_directory
+    state_directory = settings.get('node_state_dir')
+    if not state_directory:
+        raise ValueError(f"crawl_mode {mode} needs node_state_dir, a directory local to this node")
+    shared = os.path.join(os.path.abspath(base_archive_directory), '')
+    for key, path in [('node_state_dir', state_directory)] + [(key, settings.get(key)) for key in NODE_LOCAL_FILES]:
+        if path and os.path.join(os.path.abspath(path), '').startswith(shared):
+            raise ValueError(f"{key} must be local to the node in crawl_mode {mode}, not inside {base_archive_directory}")
+    os.makedirs(state_directory, exist_ok=True)
+    return state_directory
+
+
+class CrawlCoordinator:
+    """Queue every configured source once per cycle for the worker nodes to build.
+
+    A new cycle starts when the previous cycle's source builds have all finished
+    and at least ``cycle_seconds`` have passed since it started. Article tasks
+    are not waited for; they keep draining while the next cycle is queued.
+    """
+
+    def __init__(self, crawler, work_queue, cycle_seconds=0, poll_seconds=5):
+        self.crawler = crawler
+        self.work_queue = work_queue
+        self.cycle_seconds = cycle_seconds
+        self.poll_seconds = poll_seconds
+
+    def run(self, run_once):
+        try:
+            while True:
+                started = time.time()
+                source_urls = self.crawler.get_source_urls()
+                random.shuffle(source_urls)
+                queued = self.work_queue.add_sources(source_urls)
+                logging.info(f"Cycle {self.crawler.cycle}: queued {queued} of {len(source_urls)} sources")
+                self.wait(SOURCE if not run_once else None)
+                logging.info(f"Completed cycle {self.crawler.cycle}: {self.work_queue.counts()}")
+                self.crawler.cycle += 1
+                if run_once:
+                    logging.info("Exiting program after running once.")
+                    break
+                time.sleep(max(0, self.cycle_seconds - (time.time() - started)))
+        finally:
+            self.work_queue.close()
+            self.crawler.close()
+
+    def wait(self, kind=None):
+        last_log = time.time()
+        while self.work_queue.outstanding(kind):
+            time.sleep(self.poll_seconds)
+            if time.time() - last_log >= 60:
+                last_log = time.time()
+                logging.info(f"Work queue: {self.work_queue.counts()}")
+
+
+class CrawlWorker:
+    """Claim source and article tasks from the shared queue and run them through the crawler.
+
+    Each of ``threads`` threads claims ``batch_size`` tasks at a time. A source
+    task builds the source with ``NewsCrawler.build_source`` and queues the
+    links it finds; an article task goes through ``process_article``, so
+    fetching, politeness, parsing and saving are exactly those of a standalone
+    crawl. A heartbeat renews the leases of every claimed task, running or
+    still waiting in its batch, and a task whose lease was lost to another
+    node is skipped.
+
+    Politeness limits are kept per node: with N worker nodes a domain can see
+    up to N times its limit, so divide ``politeness_initial_concurrency`` and
+    ``politeness_max_concurrency`` by the number of nodes.
+    """
+
+    def __init__(self, crawler, work_queue, threads=4, batch_size=10, poll_seconds=5, node_id=None):
+        self.crawler = crawler
+        self.work_queue = work_queue
+        self.threads = max(1, int(threads))
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.node_id = node_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.sources = {}
+        self._sources_lock = threading.Lock()
+        self.held = {}
+        self._held_lock = threading.Lock()
+        self._stop = threading.Event()
+        crawler.metrics.add_collector(self.collect_queue_depths)
+
+    def run(self, run_once):
+        # Newspaper's per-node memo cache is kept; the queue already guarantees each link is fetched once.
+        self.crawler.first_run = False
+        logging.info(f"Worker {self.node_id} starting {self.threads} threads")
+        threads = [threading.Thread(target=self.work, args=(f"{self.node_id}/{number}", run_once), name=f"worker-{number}", daemon=True)
+                   for number in range(self.threads)]
+        heartbeat = threading.Thread(target=self.heartbeat, name='lease-heartbeat', daemon=True)
+        heartbeat.start()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            heartbeat.join()
+            self.work_queue.close()
+            self.crawler.close()
+
+    def work(self, owner, run_once):
+        while not self._stop.is_set():
+            tasks = self.work_queue.claim(owner, self.batch_size)
+            if not tasks:
+                if run_once and not self.work_queue.outstanding():
+                    break
+                self._stop.wait(self.poll_seconds)
+                continue
+            with self._held_lock:
+                self.held[owner] = {task.id for task in tasks}
+            for task in tasks:
+                if self._stop.is_set():
+                    break
+                self.handle(task, owner)
+                with self._held_lock:
+                    self.held[owner].discard(task.id)
+
+    def heartbeat(self):
+        """Renew held leases every third of the lease time, so slow tasks never cost the rest of a batch its claim."""
+        while not self._stop.wait(self.work_queue.lease_seconds / 3):
+            with self._held_lock:
+                held = {owner: list(task_ids) for owner, task_ids in self.held.items() if task_ids}
+            for owner, task_ids in held.items():
+                try:
+                    self.work_queue.renew_all(task_ids, owner)
+                except Exception as e:
+                    logging.error(f"Failed to renew leases for {owner}: {e}", exc_info=True)
+
+    def handle(self, task, owner):
+        if not self.work_queue.renew(task.id, owner):
+            logging.debug(f"Lease on {task} was lost; skipping it")
+            return
+        try:
+            if task.kind == SOURCE:
+                error = self.build(task)
+            elif task.kind == ARTICLE:
+                error = self.fetch(task)
+            else:
+                error = f"Unknown task kind {task.kind}"
+        except Exception as e:
+            logging.error(f"Error running {task}: {e}", exc_info=True)
+            error = e
+        if error is None:
+            self.work_queue.complete(task.id, owner)
+        else:
+            self.work_queue.fail(task.id, owner, error)
+
+    def build(self, task):
+        items = self.crawler.build_source(task.url)
+        queued = self.work_queue.add_articles(task.url, [article.url for article, source in items])
+        if items:
+            # Queued links are durable, so the source's discovery validators can be stored now.
+            self.crawler.release_source_validators(items[0][1].url)
+        logging.debug(f"Queued {queued} of {len(items)} articles from {task.url}")
+        return None
+
+    def fetch(self, task):
+        if self.crawler.seen_index is not None and task.url in self.crawler.seen_index:
+            return None
+        source = self.source(task.source_url)
+        article = Article(task.url, source_url=source.url, language=self.crawler.language)
+        if self.crawler.process_article(article, source) is None:
+            return "Article was not saved"
+        return None
+
+    def source(self, url):
+        with self._sources_lock:
+            source = self.sources.get(url)
+            if source is None:
+                source = self.sources[url] = Source(url, language=self.crawler.language)
+            return source
+
+    def collect_queue_depths(self, metrics):
+        metrics.queue_depth.replace({kind: self.work_queue.outstanding(kind) for kind in (SOURCE, ARTICLE)})
+
+
+def create_crawl_node(settings, crawler):
+    """Wrap ``crawler`` for the configured ``crawl_mode``: standalone, coordinator or worker."""
+    mode = settings.get('crawl_mode', 'standalone')
+    if mode == 'standalone':
+        return crawler
+    work_queue = create_work_queue(settings, crawler.base_archive_directory)
+    if mode == 'coordinator':
+        return CrawlCoordinator(crawler, work_queue, settings.get('coordinator_cycle_minutes', 0) * 60)
+    if mode == 'worker':
+        return CrawlWorker(crawler, work_queue, settings.get('worker_threads') or crawler.download_workers,
+                           settings.get('worker_batch_size', 10))
+    raise ValueError(f"Unknown crawl_mode: {mode}")
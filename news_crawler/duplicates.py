@@ -0,0 +1,255 @@
+import argparse
+import concurrent.futures
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+from collections import defaultdict
+from pathlib import Path
+
+from archive_store import is_article_file, iter_shard, is_shard, load_article, reference_path
+from catalog import content_hash
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+EMPTY_HASH = content_hash('')
+
+
+def simhash(text):
+    """64-bit SimHash over word 3-shingles; near-identical texts differ in only a few bits."""
+    words = re.findall(r'\w+', (text or '').lower())
+    shingles = [' '.join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+
+def bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return [value >> (band * BAND_BITS) & mask for band in range(SIMHASH_BANDS)]
+
+
+def _signed(value):
+    # SQLite integers are signed 64-bit.
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def scan_source(source_directory, state_path):
+    """Fingerprint every article in files that are new or changed since the last scan; runs in a worker process.
+
+    A file is unchanged when its path, size and mtime match what the last scan
+    recorded, so metadata-only changes such as a chmod or an extra hard link
+    don't re-read it, while a file moved by ``os.rename`` (which keeps the mtime)
+    is picked up under its new path. Every article file found is returned too,
+    so references to files that are gone can be dropped.
+    """
+    source_name = os.path.basename(source_directory)
+    connection = sqlite3.connect(state_path)
+    try:
+        known = {path: (size, mtime_ns) for path, size, mtime_ns in connection.execute(
+            "SELECT path, size, mtime_ns FROM scanned_files WHERE source = ?", (source_name,))}
+    finally:
+        connection.close()
+    rows = []
+    scanned = []
+    present = set()
+    for root, dirs, files in os.walk(source_directory):
+        for file in files:
+            path = os.path.join(root, file)
+            if not (is_article_file(file) or is_shard(file)):
+                continue
+            present.add(path)
+            try:
+                status = os.stat(path)
+                if known.get(path) == (status.st_size, status.st_mtime_ns):
+                    continue
+                articles = iter_shard(path) if is_shard(file) else [(path, load_article(path))]
+                for reference, article_data in articles:
+                    fingerprint = simhash(article_data.get('text'))
+                    rows.append((reference, source_name, status.st_mtime, article_data.get('url'),
+                                 content_hash(article_data.get('text')), _signed(fingerprint), *bands(fingerprint)))
+                scanned.append((path, source_name, status.st_size, status.st_mtime_ns))
+            except Exception as e:
+                logging.error(f"Failed to fingerprint '{path}': {e}", exc_info=True)
+    return source_name, rows, scanned, present
+
+
+class DuplicateFinder:
+    """Incremental duplicate detector with its fingerprints and the size and mtime of every scanned file in SQLite."""
+
+    def __init__(self, base_archive_directory, state_path=None):
+        self.base_archive_directory = base_archive_directory
+        self.state_path = state_path or os.path.join(base_archive_directory, '.duplicates.sqlite3')
+        self.connection = sqlite3.connect(self.state_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        band_columns = ', '.join(f"band{band} INTEGER" for band in range(SIMHASH_BANDS))
+        self.connection.executescript(f'''
+            CREATE TABLE IF NOT EXISTS files (
+                reference TEXT PRIMARY KEY, source TEXT, mtime REAL, url TEXT, content_hash TEXT, simhash INTEGER, {band_columns}
+            );
+            CREATE TABLE IF NOT EXISTS scanned_files (path TEXT PRIMARY KEY, source TEXT, size INTEGER, mtime_ns INTEGER);
+            CREATE INDEX IF NOT EXISTS scanned_files_source ON scanned_files (source);
+            CREATE INDEX IF NOT EXISTS files_url ON files (url);
+            CREATE INDEX IF NOT EXISTS files_content_hash ON files (content_hash);
+        ''')
+        for band in range(SIMHASH_BANDS):
+            self.connection.execute(f"CREATE INDEX IF NOT EXISTS files_band{band} ON files (band{band})")
+        self.connection.commit()
+
+    def scan(self, workers=4):
+        """Fingerprint files added or changed since the last scan, one source directory per worker process."""
+        sources = sorted(
+            name for name in os.listdir(self.base_archive_directory)
+            if os.path.isdir(os.path.join(self.base_archive_directory, name)) and not name.startswith('.')
+        )
+        placeholders = ', '.join('?' * (6 + SIMHASH_BANDS))
+        scanned = 0
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(scan_source, os.path.join(self.base_archive_directory, name), self.state_path)
+                for name in sources
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    source_name, rows, scanned_files, present = future.result()
+                except Exception as e:
+                    logging.error(f"Error scanning a source: {e}", exc_info=True)
+                    continue
+                # Entries of files that are gone, or were read again because they changed, are replaced.
+                changed = {path for path, *_ in scanned_files}
+                stale = [(reference,) for (reference,) in self.connection.execute(
+                    "SELECT reference FROM files WHERE source = ?", (source_name,))
+                    if reference_path(reference) not in present or reference_path(reference) in changed]
+                gone = [(path,) for (path,) in self.connection.execute(
+                    "SELECT path FROM scanned_files WHERE source = ?", (source_name,)) if path not in present]
+                self.connection.executemany("DELETE FROM files WHERE reference = ?", stale)
+                self.connection.executemany("DELETE FROM scanned_files WHERE path = ?", gone)
+                self.connection.executemany(f"INSERT OR REPLACE INTO files VALUES ({placeholders})", rows)
+                self.connection.executemany("INSERT OR REPLACE INTO scanned_files VALUES (?, ?, ?, ?)", scanned_files)
+                self.connection.commit()
+                scanned += len(rows)
+                logging.debug(f"Scanned {len(rows)} new articles for {source_name}")
+        logging.info(f"Fingerprinted {scanned} new articles across {len(sources)} sources")
+        return scanned
+
+    def _groups(self, column, exclude=None):
+        query = f"SELECT {column}, reference FROM files WHERE {column} IN " \
+                f"(SELECT {column} FROM files WHERE {column} IS NOT NULL GROUP BY {column} HAVING COUNT(*) > 1) " \
+                f"ORDER BY {column}, mtime, reference"
+        groups = defaultdict(list)
+        for key, reference in self.connection.execute(query):
+            if key != exclude:
+                groups[key].append(reference)
+        return dict(groups)
+
+    def duplicates_by_url(self):
+        return self._groups('url')
+
+    def duplicates_by_content(self):
+        return self._groups('content_hash', exclude=EMPTY_HASH)
+
+    def near_duplicates(self, max_distance=3):
+        """Pairs of articles whose SimHashes differ in at most ``max_distance`` bits.
+
+        With four 16-bit bands any pair within three bits shares at least one band,
+        so only articles colliding on a band are compared.
+        """
+        pairs = set()
+        for band in range(SIMHASH_BANDS):
+            query = f"SELECT a.reference, b.reference, a.simhash, b.simhash FROM files a " \
+                    f"JOIN files b ON a.band{band} = b.band{band} AND a.reference < b.reference " \
+                    f"WHERE a.content_hash != b.content_hash AND a.content_hash != ?"
+            for first, second, first_hash, second_hash in self.connection.execute(query, (EMPTY_HASH,)):
+                if bin((first_hash ^ second_hash) & ((1 << 64) - 1)).count('1') <= max_distance:
+                    pairs.add((first, second))
+        return sorted(pairs)
+
+    def resolve(self, groups, action, catalog=None, search_index=None):
+        """Keep the oldest file of each group and remove or hard-link the rest to it.
+
+        A removed file's URL is catalogued against the kept file, and its search
+        document moves to the kept file unless that one already has its own.
+        """
+        resolved = 0
+        for references in groups.values():
+            keep, *extras = references
+            for reference in extras:
+                if is_shard(reference_path(reference)) or is_shard(reference_path(keep)):
+                    logging.warning(f"Skipping sharded duplicate {reference}; shard entries cannot be removed individually")
+                    continue
+                try:
+                    if action == 'hardlink':
+                        if os.path.samefile(keep, reference):
+                            continue
+                        # Link beside the duplicate and rename over it, so a failed link never loses the article.
+                        temporary_path = f"{reference}.tmp"
+                        if os.path.exists(temporary_path):
+                            os.remove(temporary_path)
+                        os.link(keep, temporary_path)
+                        os.replace(temporary_path, reference)
+                    else:
+                        os.remove(reference)
+                        self.connection.execute("DELETE FROM files WHERE reference = ?", (reference,))
+                        if catalog is not None:
+                            catalog.rename_paths([(reference, keep)])
+                        if search_index is not None:
+                            search_index.merge_paths([(reference, keep)])
+                    resolved += 1
+                    logging.debug(f"{action}: {reference} -> {keep}")
+                except Exception as e:
+                    logging.error(f"Failed to {action} '{reference}': {e}", exc_info=True)
+        self.connection.commit()
+        logging.info(f"Resolved {resolved} duplicates with action '{action}'")
+        return resolved
+
+
+def write_report(output_file, url_groups, content_groups, near_pairs):
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for heading, groups in (('URL', url_groups), ('Content hash', content_groups)):
+            for key, references in groups.items():
+                f.write(f"{heading}: {key}\n")
+                for reference in references:
+                    f.write(f"    {reference}\n")
+        for first, second in near_pairs:
+            f.write(f"Near duplicate:\n    {first}\n    {second}\n")
+    logging.info(f"Duplicates saved to {output_file}")
+
+
+if __name__ == "__main__":
+    from config_handler import ConfigHandler
+    from catalog import ArchiveCatalog
+    from search_index import SearchIndex
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Find duplicate articles in the archive, scanning only new files.')
+    parser.add_argument('--config', type=str, default=str(Path(__file__).resolve().parent.parent / 'config.yml'), help='Path to the configuration file (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=4, help='Source directories scanned in parallel (default: %(default)s)')
+    parser.add_argument('--output', type=str, default='duplicates.txt', help='Report file (default: %(default)s)')
+    parser.add_argument('--near', action='store_true', help='Also report near-duplicate texts (SimHash)')
+    parser.add_argument('--max-distance', type=int, default=3, help='Maximum SimHash bit distance for near duplicates (default: %(default)s)')
+    parser.add_argument('--action', choices=['report', 'remove', 'hardlink'], default='report', help='What to do with exact duplicates (default: %(default)s)')
+    args = parser.parse_args()
+
+    try:
+        config = ConfigHandler(args.config).load_config()
+        base_archive_directory = config['settings']['base_archive_dir']
+        finder = DuplicateFinder(base_archive_directory, config['settings'].get('duplicates_file'))
+        finder.scan(args.workers)
+        url_groups = finder.duplicates_by_url()
+        content_groups = finder.duplicates_by_content()
+        near_pairs = finder.near_duplicates(args.max_distance) if args.near else []
+        write_report(args.output, url_groups, content_groups, near_pairs)
+        if args.action != 'report':
+            catalog_path = config['settings'].get('catalog_file') or os.path.join(base_archive_directory, '.catalog.sqlite3')
+            catalog = ArchiveCatalog(catalog_path) if os.path.exists(catalog_path) else None
+            search_index_path = config['settings'].get('search_index_file') or os.path.join(base_archive_directory, '.search.sqlite3')
+            search_index = SearchIndex(search_index_path) if os.path.exists(search_index_path) else None
+            finder.resolve(url_groups, args.action, catalog, search_index)
+            finder.resolve(finder.duplicates_by_content(), args.action, catalog, search_index)
+    except KeyboardInterrupt:
+        logging.info("Script interrupted by user.")
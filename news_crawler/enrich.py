@@ -0,0 +1,192 @@
+import argparse
+import concurrent.futures
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from newspaper import nlp
+from newspaper.configuration import Configuration
+from newspaper.text import StopWords
+
+from archive_store import is_shard, iter_archive, load_article, reference_path
+from catalog import source_categories
+from directory_operations import compression_for, write_atomically
+from search_index import SearchIndex, create_search_index, make_row
+
+# Enriched articles re-indexed per search index commit; each row carries the article text.
+INDEX_BATCH_SIZE = 100
+
+
+def keywords_and_summary(title, text, language='en'):
+    """Keywords and summary exactly as ``Article.nlp`` computes them, from already extracted text."""
+    configuration = Configuration()
+    stopwords = StopWords(language)
+    keywords = nlp.keywords(text, stopwords, configuration.max_keywords)
+    for keyword, score in nlp.keywords(title, stopwords, configuration.max_keywords).items():
+        keywords[keyword] = (keywords[keyword] + score) / 2 if keyword in keywords else score
+    keywords = sorted(keywords.items(), key=lambda item: item[1], reverse=True)[:configuration.max_keywords]
+    summary = nlp.summarize(title=title, text=text, stopwords=stopwords, max_sents=configuration.max_summary_sent)
+    return [keyword for keyword, _ in keywords], "\n".join(summary)
+
+
+def needs_enrichment(article_data):
+    return bool(article_data.get('text')) and not article_data.get('keywords') and not article_data.get('summary')
+
+
+class EnrichmentStore:
+    """Sidecar SQLite store of keywords and summaries, keyed by archive reference.
+
+    Shard entries cannot be rewritten in place, so their enrichment always
+    lives here; JSON files can use it too when the archive must stay untouched.
+    """
+
+    def __init__(self, store_path):
+        self.store_path = str(store_path)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS enrichment (reference TEXT PRIMARY KEY, url TEXT, keywords TEXT, summary TEXT, enriched_at REAL)"
+        )
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.store_path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def add_rows(self, rows):
+        with self._write_lock:
+            connection = self._connection()
+            connection.executemany("INSERT OR REPLACE INTO enrichment VALUES (?, ?, ?, ?, ?)", rows)
+            connection.commit()
+
+    def get(self, reference):
+        """Return ``{'keywords': [...], 'summary': ...}`` for a reference, or None."""
+        row = self._connection().execute(
+            "SELECT keywords, summary FROM enrichment WHERE reference = ?", (reference,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'keywords': json.loads(row[0]), 'summary': row[1]}
+
+    def latest_enrichment(self, prefix):
+        """When references starting with ``prefix`` were last enriched, or None."""
+        return self._connection().execute(
+            "SELECT MAX(enriched_at) FROM enrichment WHERE reference >= ? AND reference < ?", (prefix, f"{prefix}\U0010ffff")
+        ).fetchone()[0]
+
+    def __contains__(self, reference):
+        return self._connection().execute(
+            "SELECT 1 FROM enrichment WHERE reference = ?", (reference,)
+        ).fetchone() is not None
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM enrichment").fetchone()[0]
+
+
+def enrich_source(source_directory, language, in_place, sidecar_path, search_index_path=None, category=None):
+    """Enrich every article of one source that has no keywords or summary yet; runs in a worker process.
+
+    JSON files are rewritten in place when ``in_place`` is True; everything else
+    is returned as sidecar rows for the parent process to store. With a search
+    index, enriched articles are re-indexed so their keywords become searchable.
+    """
+    sidecar = EnrichmentStore(sidecar_path) if os.path.exists(sidecar_path) else None
+    search_index = SearchIndex(search_index_path) if search_index_path is not None else None
+    source_name = os.path.basename(source_directory)
+    rewritten = 0
+    rows = []
+    index_rows = []
+    for reference, article_data in iter_archive(source_directory):
+        if not needs_enrichment(article_data) or (sidecar is not None and reference in sidecar):
+            continue
+        try:
+            keywords, summary = keywords_and_summary(article_data.get('title') or '', article_data['text'], language)
+            article_data['keywords'] = keywords
+            article_data['summary'] = summary
+            if in_place and not is_shard(reference_path(reference)):
+                write_atomically(reference, json.dumps(article_data, indent=4, ensure_ascii=False), compression_for(reference))
+                rewritten += 1
+            else:
+                rows.append((reference, article_data.get('url'), json.dumps(keywords, ensure_ascii=False), summary, time.time()))
+            if search_index is not None:
+                index_rows.append(make_row(article_data, source_name, category, reference))
+                if len(index_rows) >= INDEX_BATCH_SIZE:
+                    search_index.add_rows(index_rows)
+                    index_rows = []
+        except Exception as e:
+            logging.error(f"Failed to enrich '{reference}': {e}", exc_info=True)
+    if index_rows:
+        try:
+            search_index.add_rows(index_rows)
+        except Exception as e:
+            logging.error(f"Failed to re-index enriched articles of {source_name}: {e}", exc_info=True)
+    return rewritten, rows
+
+
+def enrich_archive(base_archive_directory, sidecar, language='en', in_place=True, workers=4, search_index=None,
+                   categories=None):
+    """Compute keywords and summaries for archived articles, one source directory per worker process."""
+    categories = categories or {}
+    search_index_path = search_index.index_path if search_index is not None else None
+    sources = sorted(
+        name for name in os.listdir(base_archive_directory)
+        if os.path.isdir(os.path.join(base_archive_directory, name)) and not name.startswith('.')
+    )
+    total = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(enrich_source, os.path.join(base_archive_directory, name), language, in_place, sidecar.store_path,
+                            search_index_path, categories.get(name)): name
+            for name in sources
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                rewritten, rows = future.result()
+                sidecar.add_rows(rows)
+                total += rewritten + len(rows)
+                logging.info(f"Enriched {rewritten + len(rows)} articles for {futures[future]}")
+            except Exception as e:
+                logging.error(f"Error enriching {futures[future]}: {e}", exc_info=True)
+    logging.info(f"Enriched {total} articles from {len(sources)} sources")
+    return total
+
+
+def load_enriched_article(reference, sidecar=None):
+    """Load an article and fill in keywords and summary from the sidecar store when the archive lacks them."""
+    article_data = load_article(reference)
+    if sidecar is not None and needs_enrichment(article_data):
+        article_data.update(sidecar.get(reference) or {})
+    return article_data
+
+
+def open_enrichment_store(settings, base_archive_directory):
+    return EnrichmentStore(settings.get('enrichment_file') or os.path.join(base_archive_directory, '.enrichment.sqlite3'))
+
+
+if __name__ == "__main__":
+    from config_handler import ConfigHandler
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Compute keywords and summaries for archived articles crawled without NLP.')
+    parser.add_argument('--config', type=str, default=str(Path(__file__).resolve().parent.parent / 'config.yml'), help='Path to the configuration file (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='Source directories processed in parallel (default: %(default)s)')
+    parser.add_argument('--sidecar', action='store_true', help='Leave JSON files untouched and store all results in the sidecar database')
+    args = parser.parse_args()
+
+    try:
+        config = ConfigHandler(args.config).load_config()
+        base_archive_directory = config['settings']['base_archive_dir']
+        enrich_archive(base_archive_directory, open_enrichment_store(config['settings'], base_archive_directory),
+                       config['settings'].get('language', 'en'), not args.sidecar, args.workers,
+                       create_search_index(config['settings'], base_archive_directory), source_categories(config))
+    except KeyboardInterrupt:
+        logging.info("Enrichment interrupted by user; enriched articles are skipped on the next run.")
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import threading
+import time
+
+import aiohttp
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+
+
+class FetchError(Exception):
+    pass
+
+
+class AsyncFetcher:
+    """Asyncio HTTP engine running on its own event loop thread.
+
+    One aiohttp session is shared by every caller, so connections are kept alive
+    and reused per host. ``concurrency`` caps the open connections overall and
+    ``per_host_concurrency`` caps them per host. Callers on ordinary threads use
+    ``submit`` (returns a concurrent.futures.Future) or the blocking ``fetch``.
+    """
+
+    def __init__(self, concurrency=200, per_host_concurrency=8, timeout=30, user_agent=DEFAULT_USER_AGENT, controller=None):
+        self.concurrency = concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.controller = controller
+        self.bytes_fetched = 0
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._started = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name='async-fetcher', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        logging.info(f"Started async fetcher with concurrency {self.concurrency}, {self.per_host_concurrency} per host")
+        return self
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._open_session())
+        self._started.set()
+        self._loop.run_forever()
+
+    async def _open_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, limit_per_host=self.per_host_concurrency, ttl_dns_cache=300, keepalive_timeout=30
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={'User-Agent': self.user_agent},
+        )
+
+    async def _fetch(self, url):
+        if self.controller is None:
+            status, retry_after, text = await self._get(url)
+        else:
+            domain = self.controller.domain_of(url)
+            await self.controller.acquire_async(domain)
+            start = time.monotonic()
+            try:
+                status, retry_after, text = await self._get(url)
+            except asyncio.CancelledError:
+                self.controller.cancel(domain)
+                raise
+            except Exception:
+                self.controller.release(domain, latency=time.monotonic() - start, error=True)
+                raise
+            self.controller.release(domain, status=status, latency=time.monotonic() - start, retry_after=retry_after)
+        if status >= 400:
+            raise FetchError(f"HTTP {status} for {url}")
+        return text
+
+    async def _get(self, url):
+        async with self._session.get(url, allow_redirects=True) as response:
+            body = await response.read()
+            self.bytes_fetched += len(body)
+            text = body.decode(response.charset or 'utf-8', errors='replace')
+            return response.status, response.headers.get('Retry-After'), text
+
+    def submit(self, url):
+        if self._thread is None:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(self._fetch(url), self._loop)
+
+    def fetch(self, url):
+        return self.submit(url).result()
+
+    def close(self):
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._thread = None
+        logging.info("Stopped async fetcher")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def create_fetcher(settings, controller=None):
+    """Return a started AsyncFetcher when ``fetch_engine`` is 'async', otherwise None."""
+    if settings.get('fetch_engine', 'newspaper') != 'async':
+        return None
+    return AsyncFetcher(
+        concurrency=settings.get('fetch_concurrency', 200),
+        per_host_concurrency=settings.get('fetch_per_host_concurrency', 8),
+        timeout=settings.get('fetch_timeout', 30),
+        controller=controller,
+    ).start()
+
+
+if __name__ == "__main__":
+    # Benchmark against a local stub server: python fetcher.py [requests] [concurrency]
+    import concurrent.futures
+    import sys
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    total_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    page = b'<html><body>' + b'<p>lorem ipsum</p>' * 500 + b'</body></html>'
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(0.02)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{server.server_port}/article/{i}" for i in range(total_requests)]
+
+    with AsyncFetcher(concurrency=concurrency, per_host_concurrency=concurrency) as fetcher:
+        start = time.time()
+        futures = [fetcher.submit(url) for url in urls]
+        concurrent.futures.wait(futures)
+        elapsed = time.time() - start
+    print(f"{total_requests} requests in {elapsed:.2f}s ({total_requests / elapsed:.0f} req/s, {fetcher.bytes_fetched} bytes)")
+    server.shutdown()
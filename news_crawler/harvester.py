@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+import lxml.html
+
+from fetcher import DEFAULT_USER_AGENT
+
+
+class TokenBucket:
+    """Async token bucket allowing ``rate`` requests per second with bursts of ``capacity``."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LinkStore:
+    """Deduplicated store of harvested article links, read back by ArticleDownloader."""
+
+    def __init__(self, store_path):
+        self.store_path = str(store_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.store_path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.store_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS links (url TEXT PRIMARY KEY, source TEXT, page INTEGER, harvested_at REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS links_source ON links (source)")
+        self.connection.commit()
+
+    def add_many(self, source_name, page, urls):
+        now = time.time()
+        before = self.connection.total_changes
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO links (url, source, page, harvested_at) VALUES (?, ?, ?, ?)",
+            [(url, source_name, page, now) for url in urls],
+        )
+        self.connection.commit()
+        return self.connection.total_changes - before
+
+    def iter_urls(self, source_name=None):
+        """Yield stored URLs in harvest order without loading them all into memory."""
+        if source_name is None:
+            cursor = self.connection.execute("SELECT url FROM links ORDER BY rowid")
+        else:
+            cursor = self.connection.execute("SELECT url FROM links WHERE source = ? ORDER BY rowid", (source_name,))
+        for (url,) in cursor:
+            yield url
+
+    def export(self, output_file, source_name=None):
+        count = 0
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for url in self.iter_urls(source_name):
+                f.write(f"{url}\n")
+                count += 1
+        logging.info(f"Exported {count} links to {output_file}")
+        return count
+
+
+class PageLog:
+    """Append-only record of archive pages that were harvested successfully."""
+
+    def __init__(self, log_path):
+        self.log_path = str(log_path)
+        self.completed = set()
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'r') as f:
+                self.completed = {int(line) for line in f if line.strip().isdigit()}
+
+    def mark(self, page):
+        with open(self.log_path, 'a') as f:
+            f.write(f"{page}\n")
+        self.completed.add(page)
+
+
+class ArchiveHarvester:
+    """Walk a source's paginated archive and collect article links, resumable at page granularity.
+
+    Pages are handed to ``concurrency`` workers through a queue rather than all at
+    once, each host is throttled by a token bucket, and a page is only recorded
+    as done once its links are stored, so a resume never skips unfinished pages.
+    """
+
+    def __init__(self, source_name, harvest_config, link_store, state_directory):
+        self.source_name = source_name
+        self.archive_url = harvest_config['archive_url']
+        self.first_page = harvest_config.get('first_page', 1)
+        self.last_page = harvest_config['last_page']
+        self.link_pattern = re.compile(harvest_config.get('link_pattern', '.*'))
+        exclude_pattern = harvest_config.get('exclude_pattern')
+        self.exclude_pattern = re.compile(exclude_pattern) if exclude_pattern else None
+        self.requests_per_second = harvest_config.get('requests_per_second', 2)
+        self.concurrency = harvest_config.get('concurrency', 4)
+        self.timeout = harvest_config.get('timeout', 30)
+        self.link_store = link_store
+        os.makedirs(state_directory, exist_ok=True)
+        self.page_log = PageLog(os.path.join(state_directory, f"{source_name}.pages"))
+        self._buckets = {}
+
+    def extract_links(self, html, page_url):
+        links = []
+        seen = set()
+        for href in lxml.html.fromstring(html).xpath('//a/@href'):
+            url = urljoin(page_url, href.strip())
+            if url in seen or not self.link_pattern.search(url):
+                continue
+            if self.exclude_pattern is not None and self.exclude_pattern.search(url):
+                continue
+            seen.add(url)
+            links.append(url)
+        return links
+
+    def _bucket(self, url):
+        host = urlsplit(url).hostname
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.requests_per_second)
+        return self._buckets[host]
+
+    async def _harvest_page(self, session, page):
+        page_url = self.archive_url.format(page=page)
+        await self._bucket(page_url).acquire()
+        try:
+            async with session.get(page_url) as response:
+                response.raise_for_status()
+                html = await response.text(errors='replace')
+        except Exception as e:
+            logging.error(f"Error fetching {page_url}: {e}")
+            return
+        try:
+            links = self.extract_links(html, page_url)
+            added = self.link_store.add_many(self.source_name, page, links)
+        except Exception as e:
+            logging.error(f"Error storing links from {page_url}: {e}", exc_info=True)
+            return
+        self.page_log.mark(page)
+        logging.info(f"Harvested page {page}: {len(links)} links, {added} new")
+
+    async def _worker(self, session, pages):
+        while True:
+            page = await pages.get()
+            try:
+                await self._harvest_page(session, page)
+            except Exception as e:
+                # A worker that died here would leave pages.join() waiting forever.
+                logging.error(f"Error harvesting page {page}: {e}", exc_info=True)
+            finally:
+                pages.task_done()
+
+    async def _run(self):
+        pending = [page for page in range(self.first_page, self.last_page + 1) if page not in self.page_log.completed]
+        logging.info(f"Harvesting {len(pending)} pages for {self.source_name} "
+                     f"({len(self.page_log.completed)} already done)")
+        pages = asyncio.Queue(maxsize=self.concurrency * 2)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(timeout=timeout, headers={'User-Agent': DEFAULT_USER_AGENT}) as session:
+            workers = [asyncio.create_task(self._worker(session, pages)) for _ in range(self.concurrency)]
+            for page in pending:
+                await pages.put(page)
+            await pages.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def run(self):
+        asyncio.run(self._run())
+        remaining = self.last_page - self.first_page + 1 - len(self.page_log.completed)
+        logging.info(f"Finished harvesting {self.source_name}; {remaining} pages still to retry")
+
+
+def create_harvester(config, source_name):
+    settings = config['settings']
+    source = config['news_sources'][source_name]
+    if 'harvest' not in source:
+        raise ValueError(f"Source {source_name} has no 'harvest' block in the configuration")
+    harvest_directory = settings.get('harvest_dir') or os.path.join(settings['base_archive_dir'], '.harvest')
+    link_store = LinkStore(os.path.join(harvest_directory, 'links.sqlite3'))
+    return ArchiveHarvester(source_name, source['harvest'], link_store, harvest_directory)
+
+
+if __name__ == "__main__":
+    from config_handler import ConfigHandler
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Harvest historic article links from a source's paginated archive.")
+    parser.add_argument('source', help='Name of a news_sources entry with a harvest block')
+    parser.add_argument('--config', type=str, default=str(Path(__file__).resolve().parent.parent / 'config.yml'), help='Path to the configuration file (default: %(default)s)')
+    parser.add_argument('--export', type=str, help='Also write the harvested links to this text file')
+    args = parser.parse_args()
+
+    try:
+        config = ConfigHandler(args.config).load_config()
+        harvester = create_harvester(config, args.source)
+        harvester.run()
+        if args.export:
+            harvester.link_store.export(args.export, args.source)
+    except KeyboardInterrupt:
+        logging.info("Harvest interrupted by user; completed pages are kept for the next run.")
@@ -1,11 +1,57 @@
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import warnings
 from pathlib import Path
 from typing import Dict
 from contextlib import contextmanager
 
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record, for log shippers and jq."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'file': record.filename,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RecordQueueHandler(QueueHandler):
+    """QueueHandler that keeps the traceback in ``exc_text`` instead of folding it into the message.
+
+    The stock ``prepare`` formats the whole record into ``msg``, so formatters on
+    the listener side, such as JsonLinesFormatter, could no longer tell the
+    exception apart from the message.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
 class LoggingHandler:
+    _package_directory = Path(__file__).parent.resolve()
+    _pathname_decisions: Dict[str, bool] = {}
+
     @staticmethod
     @contextmanager
     def logging_context(config: Dict):
@@ -16,6 +62,8 @@ class LoggingHandler:
         log_backup_count = log_config.get('backup_count', 5000)
         file_log_level = log_config.get('file_level', global_level)
         console_log_level = log_config.get('console_level', global_level)
+        use_queue = log_config.get('use_queue', True)
+        log_format = log_config.get('format', 'text')
 
         log_max_size = log_max_size_mb * 1024 * 1024  # Convert MB to bytes
 
@@ -27,9 +75,12 @@ class LoggingHandler:
         root_logger = logging.getLogger()
         root_logger.setLevel(getattr(logging, global_level.upper(), logging.DEBUG))
 
-        formatter = logging.Formatter(
-            '%(asctime)s - %(levelname)s - [%(filename)s: Line %(lineno)d] - %(message)s'
-        )
+        if log_format == 'json':
+            formatter = JsonLinesFormatter()
+        else:
+            formatter = logging.Formatter(
+                '%(asctime)s - %(levelname)s - [%(filename)s: Line %(lineno)d] - %(message)s'
+            )
 
         file_handler = LoggingHandler._create_file_handler(
             log_file_path, log_max_size, log_backup_count, file_log_level, formatter
@@ -40,8 +91,20 @@ class LoggingHandler:
         if root_logger.hasHandlers():
             root_logger.handlers.clear()
 
-        root_logger.addHandler(file_handler)
-        root_logger.addHandler(stream_handler)
+        listener = None
+        if use_queue:
+            # Worker threads only enqueue records; one listener thread does the formatting and I/O.
+            # The cached path filter runs before enqueueing, so third-party records are never prepared.
+            log_queue = queue.SimpleQueue()
+            queue_handler = RecordQueueHandler(log_queue)
+            queue_handler.setLevel(min(file_handler.level, stream_handler.level))
+            queue_handler.addFilter(LoggingHandler._script_logger_filter)
+            listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+            listener.start()
+            root_logger.addHandler(queue_handler)
+        else:
+            root_logger.addHandler(file_handler)
+            root_logger.addHandler(stream_handler)
 
         LoggingHandler._suppress_warnings()
         LoggingHandler._redirect_warnings_to_logging(stream_handler)
@@ -49,6 +112,8 @@ class LoggingHandler:
         try:
             yield
         finally:
+            if listener is not None:
+                listener.stop()
             logging.shutdown()
 
     @staticmethod
@@ -69,8 +134,12 @@ class LoggingHandler:
 
     @staticmethod
     def _script_logger_filter(record: logging.LogRecord) -> bool:
-        current_directory = Path(__file__).parent.resolve()
-        return current_directory in Path(record.pathname).resolve().parents
+        # Resolving paths costs syscalls, so the answer is cached per source file.
+        decision = LoggingHandler._pathname_decisions.get(record.pathname)
+        if decision is None:
+            decision = LoggingHandler._package_directory in Path(record.pathname).resolve().parents
+            LoggingHandler._pathname_decisions[record.pathname] = decision
+        return decision
 
     @staticmethod
     def _suppress_warnings():
@@ -92,7 +161,9 @@ if __name__ == "__main__":
             'max_size_mb': 5,
             'backup_count': 5,
             'file_level': 'DEBUG',
-            'console_level': 'INFO'
+            'console_level': 'INFO',
+            'use_queue': True,
+            'format': 'text'
         }
     }
     with LoggingHandler.logging_context(config):
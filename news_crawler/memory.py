@@ -0,0 +1,99 @@
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB; the lifetime peak where the current value is unavailable.
+
+    None where the platform offers neither.
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE / 1024 / 1024
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Peak resident set size in MB since start, or since the last successful ``reset_peak_rss``; None if unknown."""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / 1024 / 1024 if sys.platform == 'darwin' else usage / 1024
+
+
+def reset_peak_rss():
+    """Restart peak tracking (Linux only); returns False where the peak can only grow for the process lifetime."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class MemoryGuard:
+    """Apply backpressure to the crawl while resident memory is above ``limit_mb``.
+
+    Stages that bring new data into the process call ``wait`` before each item.
+    Above the limit they block until RSS drops or nothing is left in flight
+    downstream; the second condition keeps the crawl moving when freed memory
+    is not handed back to the OS, so RSS never falls under the limit.
+    """
+
+    def __init__(self, limit_mb, poll_seconds=0.5):
+        self.limit_mb = limit_mb
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._last_collect = 0
+
+    def over_limit(self):
+        rss = current_rss_mb()
+        return rss is not None and rss > self.limit_mb
+
+    def wait(self, in_flight):
+        """Block while over the limit and ``in_flight()`` still reports downstream work; True if it was over."""
+        if not self.over_limit():
+            return False
+        with self._lock:
+            if time.time() - self._last_collect >= 5:
+                self._last_collect = time.time()
+                gc.collect()
+        if not self.over_limit():
+            return True
+        logging.debug(f"RSS above {self.limit_mb} MB; waiting for downstream stages to drain")
+        while self.over_limit() and in_flight() > 0:
+            time.sleep(self.poll_seconds)
+        return True
+
+
+def create_memory_guard(settings):
+    """Return a MemoryGuard when ``memory_limit_mb`` is set and RSS can be read here, otherwise None."""
+    if not settings.get('memory_limit_mb'):
+        return None
+    if current_rss_mb() is None:
+        logging.warning("memory_limit_mb is set but resident memory can't be read on this platform; "
+                        "the memory guard is off.")
+        return None
+    return MemoryGuard(settings['memory_limit_mb'])
@@ -0,0 +1,310 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from memory import current_rss_mb
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_text(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.label_names, key)} {value}")
+        return lines
+
+    def to_dict(self):
+        with self._lock:
+            return {','.join(key) or '': value for key, value in self._values.items()}
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def replace(self, values):
+        """Set every labelled value at once from ``{label value: value}`` (single-label gauges)."""
+        with self._lock:
+            self._values = {(str(label),): value for label, value in values.items()}
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One slot per bucket plus +Inf, then the running sum.
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, counts in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(self.label_names, key, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.label_names, key)} {counts[-1]}")
+                lines.append(f"{self.name}_count{_label_text(self.label_names, key)} {cumulative}")
+        return lines
+
+    def to_dict(self):
+        with self._lock:
+            summary = {}
+            for key, counts in self._values.items():
+                count = sum(counts[:-1])
+                summary[','.join(key) or ''] = {'count': count, 'mean': counts[-1] / count if count else None,
+                                                'p50': self._quantile(counts, 0.5), 'p95': self._quantile(counts, 0.95)}
+            return summary
+
+    def quantile(self, quantile, **labels):
+        with self._lock:
+            counts = self._values.get(self._key(labels))
+            return self._quantile(counts, quantile) if counts else None
+
+    def _quantile(self, counts, quantile):
+        """Upper bucket bound containing the quantile; coarse but enough to spot the slow stage."""
+        total = sum(counts[:-1])
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            running += count
+            if total and running >= quantile * total:
+                return bound
+        return None
+
+
+class CrawlMetrics:
+    """Counters, gauges and latency histograms for one crawler process.
+
+    Gauges that mirror other objects (queue depths, fetcher bytes) are filled by
+    collectors registered with ``add_collector`` and run just before each export.
+    """
+
+    def __init__(self):
+        self.source_build_seconds = Histogram('crawler_source_build_seconds', 'Time to discover or build one source', ('source',))
+        self.stage_seconds = Histogram('crawler_article_stage_seconds', 'Per-article time spent in each stage', ('stage',))
+        self.articles = Counter('crawler_articles_total', 'Articles leaving each stage', ('stage', 'outcome'))
+        self.bytes_fetched = Counter('crawler_bytes_fetched_total', 'Bytes of article HTML downloaded')
+        self.queue_depth = Gauge('crawler_queue_depth', 'Items waiting in each pipeline stage queue', ('stage',))
+        self.articles_per_second = Gauge('crawler_articles_per_second', 'Articles saved per second since the previous export')
+        self.rss_megabytes = Gauge('crawler_rss_megabytes', 'Resident memory of the crawler process')
+        self.cycle_peak_rss_megabytes = Gauge('crawler_cycle_peak_rss_megabytes', 'Peak resident memory during the last completed cycle')
+        self.memory_throttled = Counter('crawler_memory_throttled_total', 'Items held back because RSS was above memory_limit_mb', ('stage',))
+        self.metrics = [self.source_build_seconds, self.stage_seconds, self.articles, self.bytes_fetched,
+                        self.queue_depth, self.articles_per_second, self.rss_megabytes, self.cycle_peak_rss_megabytes,
+                        self.memory_throttled]
+        self._collectors = []
+        self._last_rate = (time.time(), 0)
+        self._lock = threading.Lock()
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def collect(self):
+        for collector in self._collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                logging.debug(f"Metrics collector failed: {e}")
+        rss = current_rss_mb()
+        if rss is not None:
+            self.rss_megabytes.set(round(rss, 1))
+        with self._lock:
+            now, saved = time.time(), self.articles.to_dict().get('save,ok', 0)
+            last_time, last_saved = self._last_rate
+            if now - last_time >= 1:
+                self.articles_per_second.set(round((saved - last_saved) / (now - last_time), 2))
+                self._last_rate = (now, saved)
+
+    def render_prometheus(self):
+        self.collect()
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+    def snapshot(self):
+        self.collect()
+        return {'updated': time.time(), **{metric.name: metric.to_dict() for metric in self.metrics}}
+
+    def write_snapshot(self, path):
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(temporary_path, path)
+
+
+class MetricsExporter:
+    """Serve metrics in Prometheus text format on ``port`` and/or write JSON snapshots every ``interval`` seconds."""
+
+    def __init__(self, metrics, port=None, snapshot_file=None, interval=30, host='0.0.0.0'):
+        self.metrics = metrics
+        self.port = port
+        self.snapshot_file = snapshot_file
+        self.interval = interval
+        self.host = host
+        self._server = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self.port:
+            metrics = self.metrics
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.startswith('/metrics.json'):
+                        body, content_type = json.dumps(metrics.snapshot()).encode(), 'application/json'
+                    elif self.path.startswith('/metrics'):
+                        body, content_type = metrics.render_prometheus().encode(), 'text/plain; version=0.0.4'
+                    else:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+            logging.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        if self.snapshot_file:
+            threading.Thread(target=self._export, name='metrics-export', daemon=True).start()
+        return self
+
+    def _export(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.metrics.write_snapshot(self.snapshot_file)
+            except Exception as e:
+                logging.error(f"Failed to export metrics: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+        if self.snapshot_file:
+            self.metrics.write_snapshot(self.snapshot_file)
+
+
+class SamplingProfiler:
+    """Run one call in every ``sample_every`` under cProfile and accumulate the stats.
+
+    The merged stats are written to ``output_file`` (a pstats file, readable with
+    ``python -m pstats`` or snakeviz) on ``dump``. Only the calling thread is
+    profiled, so sampling does not slow down the other workers.
+    """
+
+    def __init__(self, sample_every, output_file):
+        self.sample_every = max(1, int(sample_every))
+        self.output_file = output_file
+        self.stats = None
+        self._calls = 0
+        self._active = False
+        self._lock = threading.Lock()
+
+    def wrap(self, func):
+        def sampled(*args, **kwargs):
+            with self._lock:
+                self._calls += 1
+                # Only one cProfile can be active per process on newer Pythons.
+                sample = self._calls % self.sample_every == 0 and not self._active
+                self._active = self._active or sample
+            if not sample:
+                return func(*args, **kwargs)
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(func, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active = False
+                    if self.stats is None:
+                        self.stats = pstats.Stats(profile)
+                    else:
+                        self.stats.add(profile)
+        return sampled
+
+    def dump(self):
+        with self._lock:
+            if self.stats is not None:
+                self.stats.dump_stats(self.output_file)
+                logging.info(f"Profile of sampled calls written to {self.output_file}")
+
+
+def create_metrics_exporter(settings, base_archive_directory, metrics):
+    """Start exporting ``metrics``, or return None when neither ``metrics_port`` nor snapshots are enabled."""
+    if not settings.get('metrics_enabled', True):
+        return None
+    snapshot_file = settings.get('metrics_snapshot_file') or os.path.join(base_archive_directory, '.metrics.json')
+    return MetricsExporter(metrics, settings.get('metrics_port'), snapshot_file, settings.get('metrics_export_seconds', 30)).start()
+
+
+def create_profiler(settings, base_archive_directory):
+    """Return a SamplingProfiler when ``profile_sample_every`` is set, otherwise None."""
+    if not settings.get('profile_sample_every'):
+        return None
+    return SamplingProfiler(settings['profile_sample_every'],
+                            settings.get('profile_output_file') or os.path.join(base_archive_directory, '.crawl.pstats'))
@@ -0,0 +1,46 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from newspaper import Article
+
+
+def parse_html(url, html, language='en', run_nlp=True):
+    """Parse (and unless ``run_nlp`` is False, run NLP on) downloaded HTML, returning only the extracted fields.
+
+    Runs inside a worker process, so the Article and its DOM never cross the
+    process boundary; only the dict produced by ``to_json`` is pickled back.
+    """
+    article = Article(url, language=language)
+    article.download(input_html=html)
+    article.parse()
+    if run_nlp:
+        article.nlp()
+    return article.to_json(as_string=False)
+
+
+class ParsePool:
+    """Long-lived pool of processes for the CPU-bound parse + nlp step."""
+
+    def __init__(self, workers=4, language='en', run_nlp=True):
+        self.workers = workers
+        self.language = language
+        self.run_nlp = run_nlp
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        logging.info(f"Started parse pool with {workers} processes")
+
+    def submit(self, url, html):
+        return self.executor.submit(parse_html, url, html, self.language, self.run_nlp)
+
+    def parse(self, url, html):
+        return self.submit(url, html).result()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        logging.info("Stopped parse pool")
+
+
+def create_parse_pool(settings):
+    """Return a ParsePool when ``parse_mode`` is 'process', otherwise None."""
+    if settings.get('parse_mode', 'thread') != 'process':
+        return None
+    return ParsePool(settings.get('parse_workers', 4), settings.get('language', 'en'), settings.get('nlp_during_crawl', True))
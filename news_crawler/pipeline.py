@@ -0,0 +1,101 @@
+import logging
+import queue
+import threading
+
+
+class Stage:
+    """A pipeline stage: a pool of worker threads reading from a bounded queue.
+
+    ``func`` is called with one item and returns the value handed to the next
+    stage, or None to drop the item. When ``fan_out`` is True the return value
+    is iterated and every element is passed on individually.
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=100, fan_out=False):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.fan_out = fan_out
+        self.processed = 0
+        self.errors = 0
+        self._running = 0
+        self._lock = threading.Lock()
+
+
+class Pipeline:
+    """Run items through a chain of concurrent stages connected by bounded queues.
+
+    Every stage starts working as soon as its first item arrives, so a slow item
+    only occupies one worker of one stage instead of stalling the whole run.
+    """
+
+    _SENTINEL = object()
+
+    def __init__(self, stages):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self._threads = []
+
+    def run(self, items):
+        """Feed ``items`` into the first stage and block until every stage has drained."""
+        self._threads = []
+        for index, stage in enumerate(self.stages):
+            stage._running = stage.workers
+            for worker_number in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker, args=(index,), name=f"{stage.name}-{worker_number}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+        first_stage = self.stages[0]
+        try:
+            for item in items:
+                first_stage.queue.put(item)
+        except Exception as e:
+            logging.error(f"Error feeding pipeline: {e}", exc_info=True)
+        finally:
+            for _ in range(first_stage.workers):
+                first_stage.queue.put(self._SENTINEL)
+
+        for thread in self._threads:
+            thread.join()
+
+        for stage in self.stages:
+            logging.info(f"Pipeline stage '{stage.name}': {stage.processed} processed, {stage.errors} errors")
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            item = stage.queue.get()
+            if item is self._SENTINEL:
+                break
+            try:
+                result = stage.func(item)
+                with stage._lock:
+                    stage.processed += 1
+                if result is None or next_stage is None:
+                    continue
+                if stage.fan_out:
+                    for output in result:
+                        next_stage.queue.put(output)
+                else:
+                    next_stage.queue.put(result)
+            except Exception as e:
+                with stage._lock:
+                    stage.errors += 1
+                logging.error(f"Error in pipeline stage '{stage.name}': {e}", exc_info=True)
+
+        with stage._lock:
+            stage._running -= 1
+            last_worker = stage._running == 0
+        # The last worker out closes the next stage so it drains and exits in turn.
+        if last_worker and next_stage is not None:
+            for _ in range(next_stage.workers):
+                next_stage.queue.put(self._SENTINEL)
+
+    def queue_depths(self):
+        return {stage.name: stage.queue.qsize() for stage in self.stages}
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from newspaper import network
+from newspaper.article import ArticleDownloadState
+from newspaper.exceptions import ArticleException
+
+THROTTLE_STATUSES = (429, 503)
+POLL_INTERVAL = 0.05
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestOutcome:
+    """What the body of ``DomainController.request`` learned about the response."""
+
+    def __init__(self):
+        self.status = None
+        self.retry_after = None
+
+
+class DomainState:
+    def __init__(self, limit):
+        self.limit = float(limit)
+        self.active = 0
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.latency = None
+        self.error_rate = 0.0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+
+    def to_dict(self):
+        return {
+            'limit': round(self.limit, 2),
+            'active': self.active,
+            'requests': self.requests,
+            'errors': self.errors,
+            'throttled': self.throttled,
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'blocked_for': round(max(0.0, self.blocked_until - time.time()), 1),
+        }
+
+
+class DomainController:
+    """Per-domain AIMD concurrency control.
+
+    Each domain starts at ``initial_concurrency`` requests in flight. A fast
+    success adds about one slot per window of requests; a 429/503, error or
+    slow response halves the limit (at most once per observed latency, so one
+    burst of failures counts once). Retry-After blocks the domain outright.
+    """
+
+    def __init__(self, initial_concurrency=2, min_concurrency=1, max_concurrency=16, latency_target=5.0,
+                 decrease_factor=0.5, smoothing=0.2, state_file=None):
+        self.initial_concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.smoothing = smoothing
+        self.state_file = state_file
+        self.domains = {}
+        self._condition = threading.Condition()
+        self._export_thread = None
+        self._stop_export = threading.Event()
+        # newspaper keeps its responses to itself, so their status and Retry-After are read from a hook on its
+        # session; stop_export removes it again.
+        self._last_response = threading.local()
+        network.session.hooks['response'].append(self._remember_response)
+
+    def _remember_response(self, response, *args, **kwargs):
+        self._last_response.status = response.status_code
+        self._last_response.retry_after = response.headers.get('Retry-After')
+
+    @staticmethod
+    def domain_of(url):
+        return urlsplit(url).hostname or url
+
+    def _state(self, domain):
+        if domain not in self.domains:
+            self.domains[domain] = DomainState(self.initial_concurrency)
+        return self.domains[domain]
+
+    def try_acquire(self, domain):
+        """Take a slot and return 0, or return how many seconds to wait before trying again."""
+        with self._condition:
+            state = self._state(domain)
+            blocked_for = state.blocked_until - time.time()
+            if blocked_for > 0:
+                return blocked_for
+            if state.active >= int(state.limit):
+                return POLL_INTERVAL
+            state.active += 1
+            return 0
+
+    def acquire(self, domain):
+        while True:
+            wait = self.try_acquire(domain)
+            if wait == 0:
+                return
+            with self._condition:
+                self._condition.wait(timeout=wait)
+
+    async def acquire_async(self, domain):
+        while True:
+            wait = self.try_acquire(domain)
+            if wait == 0:
+                return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def release(self, domain, status=None, latency=None, retry_after=None, error=False):
+        with self._condition:
+            state = self._state(domain)
+            state.active = max(0, state.active - 1)
+            state.requests += 1
+            if latency is not None:
+                state.latency = latency if state.latency is None else \
+                    (1 - self.smoothing) * state.latency + self.smoothing * latency
+            failed = error or (status is not None and status >= 500)
+            throttled = status in THROTTLE_STATUSES
+            state.error_rate = (1 - self.smoothing) * state.error_rate + self.smoothing * (1.0 if failed or throttled else 0.0)
+            if failed:
+                state.errors += 1
+            if throttled:
+                state.throttled += 1
+            delay = parse_retry_after(retry_after)
+            if delay:
+                state.blocked_until = max(state.blocked_until, time.time() + delay)
+                logging.warning(f"{domain} asked to retry after {delay:.0f}s")
+            slow = latency is not None and latency > self.latency_target
+            if failed or throttled or slow:
+                self._decrease(domain, state)
+            else:
+                state.limit = min(self.max_concurrency, state.limit + 1.0 / state.limit)
+            self._condition.notify_all()
+
+    def cancel(self, domain):
+        """Give back a slot whose request was abandoned before it got an answer."""
+        with self._condition:
+            state = self._state(domain)
+            state.active = max(0, state.active - 1)
+            self._condition.notify_all()
+
+    def _decrease(self, domain, state):
+        now = time.time()
+        if now - state.last_decrease < (state.latency or 1.0):
+            return
+        state.last_decrease = now
+        state.limit = max(self.min_concurrency, state.limit * self.decrease_factor)
+        logging.debug(f"Reduced concurrency for {domain} to {state.limit:.2f}")
+
+    @contextmanager
+    def request(self, url):
+        """Hold a slot for one blocking request.
+
+        The body reports the response on the yielded RequestOutcome where it can;
+        otherwise the last response newspaper received on this thread is used.
+        A failure without any response counts as an error.
+        """
+        domain = self.domain_of(url)
+        self.acquire(domain)
+        start = time.time()
+        outcome = RequestOutcome()
+        self._last_response.__dict__.clear()
+        try:
+            yield outcome
+        except Exception:
+            self._fill_outcome(outcome)
+            self.release(domain, status=outcome.status, latency=time.time() - start, retry_after=outcome.retry_after,
+                         error=outcome.status is None)
+            raise
+        except BaseException:
+            self.cancel(domain)
+            raise
+        self._fill_outcome(outcome)
+        self.release(domain, status=outcome.status or 200, latency=time.time() - start, retry_after=outcome.retry_after)
+
+    def _fill_outcome(self, outcome):
+        if outcome.status is None:
+            outcome.status = getattr(self._last_response, 'status', None)
+            outcome.retry_after = getattr(self._last_response, 'retry_after', None)
+
+    def snapshot(self):
+        with self._condition:
+            return {domain: state.to_dict() for domain, state in sorted(self.domains.items())}
+
+    def write_snapshot(self, path):
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({'updated': time.time(), 'domains': self.snapshot()}, f, indent=2)
+        os.replace(temporary_path, path)
+
+    def start_export(self, interval=30):
+        """Write the controller state to ``state_file`` every ``interval`` seconds for monitoring."""
+        def export():
+            while not self._stop_export.wait(interval):
+                try:
+                    self.write_snapshot(self.state_file)
+                except Exception as e:
+                    logging.error(f"Failed to export politeness state: {e}")
+
+        self._export_thread = threading.Thread(target=export, name='politeness-export', daemon=True)
+        self._export_thread.start()
+
+    def stop_export(self):
+        """Stop exporting, write the final state and unhook newspaper's session."""
+        self._stop_export.set()
+        try:
+            network.session.hooks['response'].remove(self._remember_response)
+        except ValueError:
+            pass
+        if self.state_file is not None:
+            self.write_snapshot(self.state_file)
+
+
+def download_article(article, controller=None):
+    """Run ``article.download()``, under ``controller`` when given, and raise if it failed.
+
+    newspaper4k never raises on HTTP errors; it only marks the article as
+    failed. The status and Retry-After of its last response are reported to the
+    controller so 429s and 503s throttle the domain like any other engine's.
+    """
+    if controller is None:
+        article.download()
+    else:
+        with controller.request(article.url):
+            article.download()
+            if article.download_state == ArticleDownloadState.FAILED_RESPONSE:
+                raise ArticleException(f"Download of {article.url} failed: {article.download_exception_msg}")
+    if article.download_state == ArticleDownloadState.FAILED_RESPONSE:
+        raise ArticleException(f"Download of {article.url} failed: {article.download_exception_msg}")
+
+
+def create_controller(settings, base_archive_directory):
+    """Return a DomainController exporting its state, or None when ``politeness_enabled`` is false."""
+    if not settings.get('politeness_enabled', True):
+        return None
+    controller = DomainController(
+        initial_concurrency=settings.get('politeness_initial_concurrency', 2),
+        max_concurrency=settings.get('politeness_max_concurrency', 16),
+        latency_target=settings.get('politeness_latency_target', 5.0),
+        state_file=settings.get('politeness_state_file') or os.path.join(base_archive_directory, '.politeness.json'),
+    )
+    controller.start_export(settings.get('politeness_export_seconds', 30))
+    return controller
@@ -0,0 +1,229 @@
+import argparse
+import concurrent.futures
+import gzip
+import logging
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+
+from dateutil.parser import parse as parse_date
+
+from directory_operations import split_extension
+
+UNDATED_PATTERN = re.compile(r'^(\d{4}-\d{2}) (.+\.json(?:\.gz)?)$')
+PUBLISH_DATE_PATTERN = re.compile(r'(?<!\\)"publish_date"\s*:\s*(?:"((?:[^"\\]|\\.)*)"|null)')
+CHUNK_SIZE = 8192
+DONE_MARKER = '# done'
+INDEXED_MARKER = '# indexed'
+
+
+def read_publish_date(path):
+    """Return the raw ``publish_date`` string of a JSON article, reading only as far as the field.
+
+    Articles saved by the crawler carry the field before the body text, so this
+    is usually a single small read instead of loading the whole file.
+    """
+    buffer = ''
+    with (gzip.open(path, 'rt', encoding='utf-8') if path.endswith('.gz') else open(path, 'r', encoding='utf-8')) as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            buffer += chunk
+            match = PUBLISH_DATE_PATTERN.search(buffer)
+            if match:
+                return match.group(1)
+            if not chunk:
+                return None
+            # Keep a tail in case the field straddles two chunks.
+            buffer = buffer[-256:]
+
+
+def day_prefix(publish_date):
+    try:
+        dt = datetime.fromisoformat(publish_date)
+    except ValueError:
+        dt = parse_date(publish_date)
+    return dt.strftime("%Y-%m-%d")
+
+
+def free_path(directory, filename, taken):
+    """Return a path for ``filename`` in ``directory`` not used on disk or by an earlier rename."""
+    stem, extension = split_extension(filename)
+    candidate = os.path.join(directory, filename)
+    number = 2
+    while candidate in taken or os.path.exists(candidate):
+        candidate = os.path.join(directory, f"{stem} ({number}){extension}")
+        number += 1
+    taken.add(candidate)
+    return candidate
+
+
+def plan_source(source_directory):
+    """Plan ``(old_path, new_path)`` renames giving undated ``YYYY-MM <title>.json`` files their day."""
+    renames = []
+    taken = set()
+    for root, dirs, files in os.walk(source_directory):
+        dirs.sort()
+        for file in sorted(files):
+            match = UNDATED_PATTERN.match(file)
+            if not match:
+                continue
+            old_path = os.path.join(root, file)
+            try:
+                publish_date = read_publish_date(old_path)
+                if not publish_date:
+                    logging.debug(f"No publish_date in {old_path}")
+                    continue
+                new_filename = f"{day_prefix(publish_date)} {match.group(2)}"
+                renames.append((old_path, free_path(root, new_filename, taken)))
+            except Exception as e:
+                logging.error(f"Failed to plan '{old_path}': {e}", exc_info=True)
+    return renames
+
+
+def redate_source(source_directory, journal_path, dry_run=False):
+    """Plan and, unless ``dry_run``, apply the renames for one source; runs in a worker process.
+
+    Each rename is appended to the source's journal as it happens and the journal
+    is closed with a done marker, so an interrupted run redoes only unfinished sources.
+    """
+    renames = plan_source(source_directory)
+    if dry_run:
+        return renames
+    applied = []
+    with open(journal_path, 'a', encoding='utf-8') as journal:
+        for old_path, new_path in renames:
+            try:
+                os.rename(old_path, new_path)
+                journal.write(f"{old_path}\t{new_path}\n")
+                journal.flush()
+                applied.append((old_path, new_path))
+            except Exception as e:
+                logging.error(f"Failed to rename '{old_path}': {e}", exc_info=True)
+        journal.write(f"{DONE_MARKER}\n")
+    return applied
+
+
+def is_done(journal_path):
+    if not os.path.exists(journal_path):
+        return False
+    with open(journal_path, 'rb') as journal:
+        journal.seek(max(0, os.path.getsize(journal_path) - 64))
+        return DONE_MARKER in journal.read().decode('utf-8', errors='replace').splitlines()[-2:]
+
+
+def unindexed_renames(journal_path):
+    """Renames journalled since the last index marker; a torn last line from a crash is ignored."""
+    renames = []
+    with open(journal_path, 'r', encoding='utf-8') as journal:
+        for line in journal:
+            if not line.endswith('\n'):
+                break
+            line = line.rstrip('\n')
+            if line == INDEXED_MARKER:
+                renames = []
+            elif not line.startswith('#'):
+                old_path, separator, new_path = line.partition('\t')
+                if separator:
+                    renames.append((old_path, new_path))
+    return renames
+
+
+def index_renames(journal_path, renames, catalog=None, search_index=None):
+    """Apply renames to the catalog and search index, then mark them indexed in the journal."""
+    if catalog is not None:
+        catalog.rename_paths(renames)
+    if search_index is not None:
+        search_index.rename_paths(renames)
+    with open(journal_path, 'a', encoding='utf-8') as journal:
+        journal.write(f"{INDEXED_MARKER}\n")
+
+
+def replay_journals(journal_directory, catalog=None, search_index=None):
+    """Bring the indexes up to date with renames an interrupted run made on disk but never indexed."""
+    replayed = 0
+    for name in sorted(os.listdir(journal_directory)):
+        journal_path = os.path.join(journal_directory, name)
+        if not name.endswith('.journal'):
+            continue
+        renames = unindexed_renames(journal_path)
+        if renames:
+            index_renames(journal_path, renames, catalog, search_index)
+            replayed += len(renames)
+    if replayed:
+        logging.info(f"Replayed {replayed} journalled renames into the catalog and search index")
+    return replayed
+
+
+def redate_archive(base_archive_directory, journal_directory, workers=4, dry_run=False, plan_file=None, catalog=None,
+                   search_index=None):
+    """Re-date an archive one source directory per worker process, skipping sources finished by earlier runs.
+
+    Renames reach the catalog and search index in this process once a source
+    is finished. Renames an interrupted run made on disk but never indexed are
+    replayed from the journals first.
+    """
+    os.makedirs(journal_directory, exist_ok=True)
+    if not dry_run:
+        replay_journals(journal_directory, catalog, search_index)
+    sources = sorted(
+        name for name in os.listdir(base_archive_directory)
+        if os.path.isdir(os.path.join(base_archive_directory, name)) and not name.startswith('.')
+    )
+    pending = [name for name in sources if dry_run or not is_done(os.path.join(journal_directory, f"{name}.journal"))]
+    logging.info(f"Re-dating {len(pending)} of {len(sources)} sources{' (dry run)' if dry_run else ''}")
+    total = 0
+    plan = open(plan_file, 'w', encoding='utf-8') if plan_file else None
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(redate_source, os.path.join(base_archive_directory, name),
+                                os.path.join(journal_directory, f"{name}.journal"), dry_run): name
+                for name in pending
+            }
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    renames = future.result()
+                except Exception as e:
+                    logging.error(f"Error re-dating {futures[future]}: {e}", exc_info=True)
+                    continue
+                if plan is not None:
+                    plan.writelines(f"{old_path}\t{new_path}\n" for old_path, new_path in renames)
+                if not dry_run:
+                    index_renames(os.path.join(journal_directory, f"{futures[future]}.journal"), renames, catalog, search_index)
+                total += len(renames)
+                logging.info(f"{'Planned' if dry_run else 'Renamed'} {len(renames)} files for {futures[future]}")
+    finally:
+        if plan is not None:
+            plan.close()
+    logging.info(f"{'Planned' if dry_run else 'Renamed'} {total} files across {len(pending)} sources")
+    return total
+
+
+if __name__ == "__main__":
+    from config_handler import ConfigHandler
+    from catalog import ArchiveCatalog
+    from search_index import SearchIndex
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Add the publish day to 'YYYY-MM <title>.json' archive files.")
+    parser.add_argument('--config', type=str, default=str(Path(__file__).resolve().parent.parent / 'config.yml'), help='Path to the configuration file (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=4, help='Source directories processed in parallel (default: %(default)s)')
+    parser.add_argument('--dry-run', action='store_true', help='Only plan the renames; write them to --plan if given')
+    parser.add_argument('--plan', type=str, help='Write the (planned) renames to this tab-separated file')
+    parser.add_argument('--journal-dir', type=str, help='Directory for per-source journals (default: <archive>/.redate)')
+    args = parser.parse_args()
+
+    try:
+        config = ConfigHandler(args.config).load_config()
+        base_archive_directory = config['settings']['base_archive_dir']
+        if not os.path.exists(base_archive_directory):
+            raise SystemExit(f"Base archive directory {base_archive_directory} does not exist")
+        catalog_path = config['settings'].get('catalog_file') or os.path.join(base_archive_directory, '.catalog.sqlite3')
+        catalog = ArchiveCatalog(catalog_path) if os.path.exists(catalog_path) else None
+        search_index_path = config['settings'].get('search_index_file') or os.path.join(base_archive_directory, '.search.sqlite3')
+        search_index = SearchIndex(search_index_path) if os.path.exists(search_index_path) else None
+        redate_archive(base_archive_directory, args.journal_dir or os.path.join(base_archive_directory, '.redate'),
+                       args.workers, args.dry_run, args.plan, catalog, search_index)
+    except KeyboardInterrupt:
+        logging.info("Re-dating interrupted by user; finished sources are skipped on the next run.")
@@ -0,0 +1,175 @@
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+
+
+class SourceSchedule:
+    """Learned publish rate (new articles per hour) and visit times for one source."""
+
+    def __init__(self, rate, last_visit=None):
+        self.rate = rate
+        self.last_visit = last_visit
+        self.visits = 0
+
+    def to_dict(self):
+        return {'rate': self.rate, 'last_visit': self.last_visit, 'visits': self.visits}
+
+    @classmethod
+    def from_dict(cls, data, rate):
+        schedule = cls(data.get('rate', rate), data.get('last_visit'))
+        schedule.visits = data.get('visits', 0)
+        return schedule
+
+
+class SourceScheduler:
+    """Priority queue of sources ordered by when each is next due for a visit.
+
+    Every visit reports how many new articles the source yielded. The yield
+    divided by the time since the previous visit gives an observed publish rate,
+    smoothed into the source's estimate, and the next visit is planned for when
+    about ``target_yield`` new articles should be waiting. Busy wires are thus
+    revisited within minutes and quiet sites drift towards ``max_interval_hours``.
+    Until a source has history its rate comes from its category prior.
+    """
+
+    def __init__(self, target_yield=10, min_interval_minutes=5, max_interval_hours=24, smoothing=0.3,
+                 default_rate=1.0, category_priors=None, state_file=None, save_seconds=60):
+        self.target_yield = target_yield
+        self.min_interval = min_interval_minutes * 60
+        self.max_interval = max_interval_hours * 3600
+        self.smoothing = smoothing
+        self.default_rate = default_rate
+        self.category_priors = category_priors or {}
+        self.state_file = state_file
+        self.save_seconds = save_seconds
+        self.sources = {}
+        self._heap = []
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._saved = {}
+        self._last_save = time.time()
+        self.load()
+
+    def interval(self, schedule):
+        if schedule.rate <= 0:
+            return self.max_interval
+        return min(self.max_interval, max(self.min_interval, self.target_yield / schedule.rate * 3600))
+
+    def add(self, url, category=None, now=None):
+        """Register a source; known sources keep their learned rate and are due one interval after their last visit."""
+        now = now or time.time()
+        prior = self.category_priors.get(category, self.default_rate)
+        with self._condition:
+            if url in self.sources:
+                return
+            schedule = SourceSchedule.from_dict(self._saved[url], prior) if url in self._saved else SourceSchedule(prior)
+            self.sources[url] = schedule
+            due = schedule.last_visit + self.interval(schedule) if schedule.last_visit else now
+            heapq.heappush(self._heap, (due, url))
+            self._condition.notify()
+
+    def remove(self, url):
+        """Stop scheduling a source; an entry still queued for it is dropped when it comes due."""
+        with self._condition:
+            self.sources.pop(url, None)
+
+    def record(self, url, new_articles, now=None):
+        """Update the rate of a visited source from its yield and queue its next visit.
+
+        ``new_articles`` of None means the visit did not happen (for example the
+        source is cooling down), so the estimate is left alone.
+        """
+        now = now or time.time()
+        with self._condition:
+            schedule = self.sources.get(url)
+            if schedule is None:
+                return
+            if new_articles is not None:
+                # The first visit sees the whole homepage backlog, which says nothing about the rate.
+                if schedule.last_visit is not None:
+                    elapsed_hours = max(now - schedule.last_visit, 60) / 3600
+                    observed = new_articles / elapsed_hours
+                    schedule.rate = (1 - self.smoothing) * schedule.rate + self.smoothing * observed
+                schedule.last_visit = now
+                schedule.visits += 1
+            interval = self.interval(schedule)
+            heapq.heappush(self._heap, (now + interval, url))
+            self._condition.notify()
+            save_due = now - self._last_save >= self.save_seconds
+            if save_due:
+                self._last_save = now
+        logging.debug(f"{url}: {new_articles} new articles, {schedule.rate:.2f}/h, next visit in {interval / 60:.0f} min")
+        if save_due:
+            try:
+                self.save()
+            except Exception as e:
+                logging.error(f"Failed to save scheduler state: {e}")
+
+    def iter_due(self):
+        """Yield source URLs as they fall due, blocking in between, until ``stop`` is called.
+
+        A source leaves the queue when it is yielded and only returns through
+        ``record``, so it is never visited twice at the same time.
+        """
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if self._heap:
+                        wait = self._heap[0][0] - time.time()
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    self._condition.wait(timeout=wait)
+                if self._stopped:
+                    return
+                _, url = heapq.heappop(self._heap)
+                if url not in self.sources:
+                    continue
+            yield url
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self.save()
+
+    def snapshot(self):
+        with self._condition:
+            return {url: dict(schedule.to_dict(), interval=round(self.interval(schedule)))
+                    for url, schedule in self.sources.items()}
+
+    def load(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                self._saved = json.load(f).get('sources', {})
+            logging.info(f"Loaded publish rates for {len(self._saved)} sources from {self.state_file}")
+        except Exception as e:
+            logging.error(f"Failed to load scheduler state: {e}", exc_info=True)
+
+    def save(self):
+        if not self.state_file:
+            return
+        temporary_path = f"{self.state_file}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({'sources': self.snapshot()}, f, indent=2)
+        os.replace(temporary_path, self.state_file)
+
+
+def create_scheduler(settings, base_archive_directory):
+    """Return a SourceScheduler, or None when ``schedule_mode`` is not 'priority'."""
+    if settings.get('schedule_mode', 'cycle') != 'priority':
+        return None
+    return SourceScheduler(
+        target_yield=settings.get('schedule_target_yield', 10),
+        min_interval_minutes=settings.get('schedule_min_interval_minutes', 5),
+        max_interval_hours=settings.get('schedule_max_interval_hours', 24),
+        default_rate=settings.get('schedule_default_rate', 1.0),
+        category_priors=settings.get('schedule_category_priors'),
+        state_file=settings.get('schedule_state_file') or os.path.join(base_archive_directory, '.schedule.json'),
+    )
@@ -1,20 +1,38 @@
 import logging
 import sys
 from pathlib import Path
-from newspaper import Source, utils
-from newspaper.mthreading import fetch_news
-import concurrent.futures
+from newspaper import Article, Source, utils
 import os
 from logging_handler import LoggingHandler
-from config_handler import ConfigHandler
-from directory_operations import save_article, check_and_create_base_directory
+from config_handler import ConfigHandler, load_sources
+from directory_operations import save_article_data, check_and_create_base_directory
+from pipeline import Pipeline, Stage
+from seen_index import open_seen_index
+from fetcher import create_fetcher
+from politeness import create_controller, download_article
+from parse_pool import create_parse_pool
+from archive_store import create_store
+from catalog import open_catalog
+from source_health import SourceHealth, create_source_health
+from discovery import create_discovery
+from scheduler import create_scheduler
+from metrics import CrawlMetrics, create_metrics_exporter, create_profiler
+from cycle_journal import create_cycle_journal
+from memory import create_memory_guard, peak_rss_mb, reset_peak_rss
+from search_index import create_search_index
+from distributed import create_crawl_node, node_state_directory
 import platform
 import random
-import yaml
-from datetime import datetime, timedelta
+import threading
+import time
 
 class NewsCrawler:
-    def __init__(self, config, base_archive_directory, language='en', max_workers=5, sources_per_batch=2, failed_source_threshold=5, failure_time_window_hours=24):
+    def __init__(self, config, base_archive_directory, *, language='en', max_workers=5, sources_per_batch=2, failed_source_threshold=5, failure_time_window_hours=24,
+                 build_workers=None, download_workers=None, parse_workers=None, save_workers=2, queue_size=200,
+                 seen_index=None, fetcher=None, parse_pool=None, store=None, catalog=None, controller=None, health=None, discovery=None,
+                 scheduler=None, run_nlp=True, metrics=None, exporter=None, profiler=None, config_handler=None,
+                 config_reload_seconds=60, file_compression=None, dedupe_content='off', journal=None, memory_guard=None,
+                 search_index=None):
         logging.info("Initializing NewsCrawler")
         self.config = config
         self.language = language
@@ -22,12 +40,43 @@ class NewsCrawler:
         self.base_archive_directory = base_archive_directory
         self.max_workers = max_workers
         self.sources_per_batch = sources_per_batch
+        self.build_workers = build_workers or sources_per_batch
+        self.download_workers = download_workers or max_workers
+        self.parse_workers = parse_workers or max_workers
+        self.save_workers = save_workers
+        self.queue_size = queue_size
         self.failed_source_threshold = failed_source_threshold
-        self.failure_time_window = timedelta(hours=failure_time_window_hours)
-        self.failure_log = {}
+        self.health = health or SourceHealth(failed_source_threshold, failure_time_window_hours)
+        self.discovery = discovery
+        # Discovery validators wait here until every article their pages led to has left the pipeline.
+        self.unfinished_sources = {}
+        self._unfinished_lock = threading.Lock()
+        self.scheduler = scheduler
+        self.run_nlp = run_nlp
+        self.metrics = metrics or CrawlMetrics()
+        self.exporter = exporter
+        self.profiler = profiler
+        if profiler is not None:
+            self.process_article = profiler.wrap(self.process_article)
+        self.pipeline = None
+        self.metrics.add_collector(self.collect_queue_depths)
         self.os_type = platform.system()
-        self.sources = []
-        self.articles = []
+        self.seen_index = seen_index
+        self.fetcher = fetcher
+        self.controller = controller
+        self.parse_pool = parse_pool
+        self.store = store
+        self.catalog = catalog
+        self.file_compression = file_compression
+        self.dedupe_content = dedupe_content
+        self.journal = journal
+        self.memory_guard = memory_guard
+        self.search_index = search_index
+        self.config_handler = config_handler
+        self.config_reload_seconds = config_reload_seconds
+        self.last_reload_check = time.time()
+        self.sources = load_sources(config)
+        self.source_categories = {source.base_url: source.category for source in self.sources}
         self.cycle = 1
 
     def set_run(self, run=None):
@@ -39,139 +88,347 @@ class NewsCrawler:
             logging.error(f"Invalid run: {run}")
             sys.exit(1)
 
-    def build_source(self, source):
+    def build_source(self, url):
+        if not self.health.is_available(url):
+            if self.scheduler is not None:
+                self.scheduler.record(url, None)
+            return []
+        if self.journal is not None and self.journal.is_built(url):
+            return self.resume_articles(url)
+        self.apply_backpressure('build')
+        with self.metrics.source_build_seconds.time(source=url):
+            items = self.collect_articles(url)
+        if self.journal is not None:
+            self.journal.record_built(url, [article.url for article, source in items])
+        if self.scheduler is not None:
+            self.scheduler.record(url, len(items))
+        return items
+
+    def resume_articles(self, url):
+        """Articles a source yielded earlier in an interrupted cycle that were never saved."""
+        source = Source(url, language=self.language)
+        article_urls = self.journal.pending(url)
+        if self.seen_index is not None:
+            article_urls = [article_url for article_url in article_urls if article_url not in self.seen_index]
+        return [(Article(article_url, source_url=source.url, language=self.language), source) for article_url in article_urls]
+
+    def collect_articles(self, url):
+        source = Source(url, language=self.language)
+        if self.first_run:
+            logging.info(f"Cleaning memo_cache for {source.url}.")
+            source.clean_memo_cache()
         try:
-            source.build()
-            logging.debug(f"Built source: {source.url}")
+            homepage_html = None
+            validators = []
+            if self.discovery is not None:
+                result = self.discovery.discover(url)
+                if result.unchanged:
+                    logging.debug(f"No new articles for {url}")
+                    self.discovery.remember(result.validators)
+                    return []
+                if result.article_urls is not None:
+                    logging.debug(f"Discovered {len(result.article_urls)} new articles for {url} from feeds")
+                    items = [(Article(article_url, source_url=source.url, language=self.language), source)
+                             for article_url in result.article_urls]
+                    self.track_source(source.url, len(items), result.validators)
+                    return items
+                homepage_html, validators = result.homepage_html, result.validators
+            source.build(input_html=homepage_html)
+            logging.debug(f"Built source: {source.url} with {len(source.articles)} articles")
         except Exception as e:
             logging.error(f"Error building source {source.url}: {e}", exc_info=True)
             self.record_failure(source.url)
+            return []
+        articles = source.articles
+        self.release_source(source)
+        if self.seen_index is not None:
+            articles = [article for article in articles if article.url not in self.seen_index]
+        self.track_source(source.url, len(articles), validators)
+        return [(article, source) for article in articles]
 
-    def build_sources(self, max_workers):
-        try:
-            logging.info("Building sources.")
-            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {executor.submit(self.build_source, source): source for source in self.sources}
-                for future in concurrent.futures.as_completed(futures):
-                    source = futures[future]
-                    try:
-                        future.result()
-                    except Exception as e:
-                        logging.error(f"Source {source.url} generated an exception: {e}", exc_info=True)
-            logging.info("Sources built successfully")
-        except Exception as e:
-            logging.error(f"Error building sources: {e}", exc_info=True)
+    def track_source(self, source_url, article_count, validators):
+        """Hold a source's discovery validators until its ``article_count`` articles are processed."""
+        if not validators:
+            return
+        if article_count == 0:
+            self.discovery.remember(validators)
+            return
+        with self._unfinished_lock:
+            self.unfinished_sources[source_url] = [article_count, validators]
 
-    def crawl_articles(self):
-        try:
-            logging.info("Crawling articles.")
-            self.articles = fetch_news(self.sources, threads=4)
-            logging.info("Articles crawled successfully.")
-        except Exception as e:
-            logging.error(f"Error crawling articles: {e}", exc_info=True)
+    def finish_article(self, source_url):
+        with self._unfinished_lock:
+            entry = self.unfinished_sources.get(source_url)
+            if entry is None:
+                return
+            entry[0] -= 1
+            if entry[0] > 0:
+                return
+            del self.unfinished_sources[source_url]
+        self.discovery.remember(entry[1])
+
+    def release_source_validators(self, source_url):
+        """Store a source's validators at once, for articles handed over to the durable work queue."""
+        with self._unfinished_lock:
+            entry = self.unfinished_sources.pop(source_url, None)
+        if entry is not None:
+            self.discovery.remember(entry[1])
+
+    def tracked(self, func, last=False):
+        """Wrap a stage so each article that leaves the pipeline through it counts towards ``finish_article``."""
+        def stage(item):
+            result = None
+            try:
+                result = func(item)
+                return result
+            finally:
+                if result is None or last:
+                    self.finish_article(item[1].url)
+        return stage
+
+    @staticmethod
+    def release_source(source):
+        """Drop the pages and article list a built Source holds on to.
 
-    def extract_information(self):
+        Every queued item references its Source, so without this each source's
+        homepage, category DOMs and every downloaded article stay in memory
+        until the last of its articles is saved. Later stages only need the
+        source's url and brand.
+        """
+        source.articles = []
+        source.html = ''
+        source.doc = None
+        for category in source.categories:
+            category.html = None
+            category.doc = None
+        for feed in source.feeds:
+            feed.rss = None
+
+    def apply_backpressure(self, stage):
+        if self.memory_guard is not None and self.memory_guard.wait(lambda: self.in_flight(stage)):
+            self.metrics.memory_throttled.inc(stage=stage)
+
+    def in_flight(self, stage):
+        """Items queued in the stages after ``stage``, whose completion frees memory."""
+        if self.pipeline is None:
+            return 0
+        depths = list(self.pipeline.queue_depths().items())
+        names = [name for name, depth in depths]
+        return sum(depth for name, depth in depths[names.index(stage) + 1:]) if stage in names else 0
+
+    def download_article(self, item):
+        article, source = item
+        if not self.health.is_available(source.url):
+            return None
+        if self.seen_index is not None and article.url in self.seen_index:
+            logging.debug(f"Skipping already archived article: {article.url}")
+            return None
+        self.apply_backpressure('download')
         try:
-            logging.info("Extracting information from articles")
-            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                futures = []
-                for source in self.sources:
-                    for article in source.articles:
-                        futures.append(executor.submit(self.process_article, article, source))
-                for future in concurrent.futures.as_completed(futures):
-                    try:
-                        future.result()
-                    except Exception as e:
-                        logging.error(f"Error processing an article: {e}", exc_info=True)
+            with self.metrics.stage_seconds.time(stage='download'):
+                if self.fetcher is not None:
+                    article.download(input_html=self.fetcher.fetch(article.url))
+                else:
+                    download_article(article, self.controller)
+            self.metrics.bytes_fetched.inc(len(article.html.encode('utf-8')))
+            self.metrics.articles.inc(stage='download', outcome='ok')
+            return item
         except Exception as e:
-            logging.error(f"Error extracting information: {e}", exc_info=True)
+            logging.error(f"Error downloading article from source {source.url}: {e}", exc_info=True)
+            self.metrics.articles.inc(stage='download', outcome='error')
+            self.record_failure(source.url)
+            return None
 
-    def process_article(self, article, source):
+    def parse_article(self, item):
+        article, source = item
         try:
-            article.download()
-            article.parse()
-            article.nlp()
-            save_article(article, source, self.base_archive_directory, self.os_type)
+            if self.parse_pool is not None:
+                # In the process pool parse and NLP run together, so they are timed as one.
+                with self.metrics.stage_seconds.time(stage='parse'):
+                    article_data = self.parse_pool.parse(article.url, article.html)
+            else:
+                with self.metrics.stage_seconds.time(stage='parse'):
+                    article.parse()
+                if self.run_nlp:
+                    with self.metrics.stage_seconds.time(stage='nlp'):
+                        article.nlp()
+                article_data = article.to_json(as_string=False)
+            self.metrics.articles.inc(stage='parse', outcome='ok')
+            # The link URL travels on, since parsing may replace the URL with the canonical one.
+            return article_data, source, article.url
         except Exception as e:
-            logging.error(f"Error processing article from source {source.url}: {e}", exc_info=True)
+            logging.error(f"Error parsing article from source {source.url}: {e}", exc_info=True)
+            self.metrics.articles.inc(stage='parse', outcome='error')
             self.record_failure(source.url)
+            return None
+
+    def store_article(self, item):
+        article_data, source, link_url = item
+        with self.metrics.stage_seconds.time(stage='save'):
+            save_path = save_article_data(article_data, source.brand, self.base_archive_directory, self.os_type, self.store,
+                                          self.catalog, self.source_categories.get(source.url), self.file_compression,
+                                          self.dedupe_content, self.search_index)
+        self.metrics.articles.inc(stage='save', outcome='ok' if save_path is not None else 'error')
+        if save_path is not None and self.seen_index is not None:
+            self.seen_index.add_many({article_data['url'], link_url})
+        if save_path is not None and self.journal is not None:
+            self.journal.record_saved(link_url)
+        return save_path
+
+    def process_article(self, article, source):
+        """Download, parse and save one article; returns where it was saved, or None."""
+        item = self.download_article((article, source))
+        if item is not None:
+            item = self.parse_article(item)
+        if item is not None:
+            return self.store_article(item)
+        return None
+
+    def create_pipeline(self):
+        stages = [
+            Stage('build', self.build_source, self.build_workers, self.queue_size, fan_out=True),
+            Stage('download', self.tracked(self.download_article), self.download_workers, self.queue_size),
+            Stage('parse', self.tracked(self.parse_article), self.parse_workers, self.queue_size),
+            Stage('save', self.tracked(self.store_article, last=True), self.save_workers, self.queue_size),
+        ]
+        if self.profiler is not None:
+            # The pipeline runs process_article's steps as separate stages, so each stage is sampled.
+            for stage in stages[1:]:
+                stage.func = self.profiler.wrap(stage.func)
+        self.pipeline = Pipeline(stages)
+        return self.pipeline
+
+    def collect_queue_depths(self, metrics):
+        if self.pipeline is not None:
+            metrics.queue_depth.replace(self.pipeline.queue_depths())
 
     def record_failure(self, url):
-        now = datetime.now()
-        if url not in self.failure_log:
-            self.failure_log[url] = []
-        self.failure_log[url].append(now)
         logging.warning(f"Recording failure for {url}")
-        self.failure_log[url] = [timestamp for timestamp in self.failure_log[url] if timestamp > now - self.failure_time_window]
-        if len(self.failure_log[url]) > self.failed_source_threshold:
-            self.mark_source_as_failed(url)
+        if self.health.record_failure(url):
             self.remove_source(url)
 
-    def mark_source_as_failed(self, url):
-        logging.warning(f"Marking source {url} as failed due to repeated failures.")
-        config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.yml')
-        with open(config_path, 'r') as file:
-            config = yaml.safe_load(file)
-        for source_name, source in config['news_sources'].items():
-            if source['base_url'] == url:
-                source['failed'] = True
-                break
-        with open(config_path, 'w') as file:
-            yaml.dump(config, file)
-
     def remove_source(self, url):
-        logging.info(f"Removing source {url} from the active sources list.")
-        self.sources = [source for source in self.sources if source.url != url]
+        logging.info(f"Removing source {url} from the active sources list until its cool-down ends.")
+
+    def configured_source_urls(self):
+        return [source.base_url for source in self.sources if not source.failed]
 
     def get_source_urls(self):
         try:
-            news_sources = self.config.get('news_sources', {})
-            base_urls = [source['base_url'] for source in news_sources.values() if not source.get('failed', False)]
+            self.reload_sources()
+            base_urls = [url for url in self.configured_source_urls() if self.health.is_available(url)]
             logging.info(f"Retrieved {len(base_urls)} source URLs from configuration.")
             return base_urls
         except Exception as e:
             logging.error(f"Failed to get source URLs: {e}", exc_info=True)
             raise
 
+    def reload_sources(self):
+        """Pick up an edited source list from config.yml without restarting; returns True if it changed."""
+        if self.config_handler is None:
+            return False
+        config = self.config_handler.reload_if_changed()
+        if config is None:
+            return False
+        previous = set(self.configured_source_urls())
+        self.config = config
+        self.sources = load_sources(config)
+        self.source_categories = {source.base_url: source.category for source in self.sources}
+        current = set(self.configured_source_urls())
+        if self.scheduler is not None:
+            for url in current - previous:
+                self.scheduler.add(url, self.source_categories.get(url))
+            for url in previous - current:
+                self.scheduler.remove(url)
+        logging.info(f"Reloaded source list: {len(current - previous)} added, {len(previous - current)} removed")
+        return True
+
+    def scheduled_source_urls(self):
+        for url in self.scheduler.iter_due():
+            if time.time() - self.last_reload_check >= self.config_reload_seconds:
+                self.last_reload_check = time.time()
+                self.reload_sources()
+            yield url
+
     def run_once_cycle(self):
-        source_urls = self.get_source_urls()
-        random.shuffle(source_urls)
-        logging.debug(f"Fetched {len(source_urls)} source URLs from configuration.")
-        for i in range(0, len(source_urls), self.sources_per_batch):
-            batch_urls = source_urls[i:i+self.sources_per_batch]
-            logging.info(f"Processing batch URLs: {batch_urls}")
-            self.sources = [Source(url, language=self.language) for url in batch_urls]
-            for source in self.sources:
-                if self.first_run:
-                    logging.info(f"Cleaning memo_cache for {source.url}.")
-                    source.clean_memo_cache()
-            self.set_run(self.first_run)
-            self.build_sources(self.max_workers)
-            self.crawl_articles()
-            self.extract_information()
-        logging.info(f"Completed cycle {self.cycle}. Preparing for the next cycle.")
+        reset_peak_rss()
+        if self.journal is not None and self.journal.resumable:
+            # Picking up a cycle cut short by a restart; its memo caches were already handled.
+            self.cycle, self.first_run = self.journal.cycle, self.journal.first_run
+            source_urls = self.journal.resume()
+        else:
+            source_urls = self.get_source_urls()
+            random.shuffle(source_urls)
+            logging.debug(f"Fetched {len(source_urls)} source URLs from configuration.")
+            if self.journal is not None:
+                self.journal.start(self.cycle, self.first_run, source_urls)
+        self.create_pipeline().run(source_urls)
+        if self.journal is not None:
+            self.journal.finish()
+        peak = peak_rss_mb()
+        if peak is None:
+            logging.info(f"Completed cycle {self.cycle}. Preparing for the next cycle.")
+        else:
+            peak = round(peak, 1)
+            self.metrics.cycle_peak_rss_megabytes.set(peak)
+            logging.info(f"Completed cycle {self.cycle} with peak RSS {peak} MB. Preparing for the next cycle.")
         self.cycle += 1
         self.first_run = False
 
+    def run_scheduled(self):
+        """Visit sources continuously in the order the scheduler says they fall due."""
+        # Sources cooling down are scheduled too; build_source postpones them until they recover.
+        for url in self.configured_source_urls():
+            if self.first_run:
+                Source(url, language=self.language).clean_memo_cache()
+            self.scheduler.add(url, self.source_categories.get(url))
+        self.first_run = False
+        logging.info(f"Scheduling {len(self.scheduler.sources)} sources by publish rate.")
+        self.create_pipeline().run(self.scheduled_source_urls())
+
     def run(self, run_once):
-        while True:
-            logging.info("Starting a new cycle to fetch and process sources.")
-            self.run_once_cycle()
-            if run_once:
-                logging.info("Exiting program after running once.")
-                break
-
-def create_news_crawler():
+        try:
+            if self.scheduler is not None and not run_once:
+                self.run_scheduled()
+                return
+            while True:
+                logging.info("Starting a new cycle to fetch and process sources.")
+                self.run_once_cycle()
+                if run_once:
+                    logging.info("Exiting program after running once.")
+                    break
+        finally:
+            self.close()
+
+    def close(self):
+        if self.fetcher is not None:
+            self.fetcher.close()
+        if self.parse_pool is not None:
+            self.parse_pool.close()
+        if self.controller is not None:
+            self.controller.stop_export()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self.profiler is not None:
+            self.profiler.dump()
+        if self.exporter is not None:
+            self.exporter.stop()
+        self.health.stop()
+        if self.journal is not None:
+            self.journal.close()
+
+def create_news_crawler(handler=None):
     try:
-        config_path = Path(__file__).resolve().parent.parent / 'config.yml'
-        handler = ConfigHandler(config_path)
-        config = handler.load_config()  # Use the instance method
+        if handler is None:
+            handler = ConfigHandler(Path(__file__).resolve().parent.parent / 'config.yml')
+        config = handler.config or handler.load_config()
 
         if config is None:
             logging.critical("Configuration is None after loading. Exiting.")
             sys.exit(1)
 
         base_archive_directory = check_and_create_base_directory(config['settings']['base_archive_dir'])
+        state_directory = node_state_directory(config['settings'], base_archive_directory)
         utils.cache_disk.enabled = False
         run_once = config['settings']['run_once']
         max_workers = config['settings'].get('max_workers', 5)
@@ -179,8 +436,39 @@ def create_news_crawler():
         failed_source_threshold = config['settings'].get('failed_source_threshold', 5)
         failure_time_window_hours = config['settings'].get('failure_time_window_hours', 24)
         language = config['settings'].get('language', 'en')
+        build_workers = config['settings'].get('build_workers', sources_per_batch)
+        download_workers = config['settings'].get('download_workers', max_workers)
+        parse_workers = config['settings'].get('parse_workers', max_workers)
+        save_workers = config['settings'].get('save_workers', 2)
+        queue_size = config['settings'].get('queue_size', 200)
+        seen_index = open_seen_index(config['settings'], state_directory)
+        controller = create_controller(config['settings'], state_directory)
+        fetcher = create_fetcher(config['settings'], controller)
+        parse_pool = create_parse_pool(config['settings'])
+        store = create_store(config['settings'], base_archive_directory)
+        catalog = open_catalog(config['settings'], state_directory)
+        health = create_source_health(config['settings'], state_directory)
+        discovery = create_discovery(config['settings'], state_directory, seen_index, controller)
+        scheduler = create_scheduler(config['settings'], state_directory)
+        run_nlp = config['settings'].get('nlp_during_crawl', True)
+        metrics = CrawlMetrics()
+        exporter = create_metrics_exporter(config['settings'], state_directory, metrics)
+        profiler = create_profiler(config['settings'], state_directory)
+        journal = create_cycle_journal(config['settings'], state_directory)
+        memory_guard = create_memory_guard(config['settings'])
+        search_index = create_search_index(config['settings'], state_directory)
 
-        return NewsCrawler(config, base_archive_directory, language, max_workers, sources_per_batch, failed_source_threshold, failure_time_window_hours), run_once
+        return NewsCrawler(config, base_archive_directory, language=language, max_workers=max_workers,
+                           sources_per_batch=sources_per_batch, failed_source_threshold=failed_source_threshold,
+                           failure_time_window_hours=failure_time_window_hours, build_workers=build_workers,
+                           download_workers=download_workers, parse_workers=parse_workers, save_workers=save_workers,
+                           queue_size=queue_size, seen_index=seen_index, fetcher=fetcher, parse_pool=parse_pool, store=store,
+                           catalog=catalog, controller=controller, health=health, discovery=discovery, scheduler=scheduler,
+                           run_nlp=run_nlp, metrics=metrics, exporter=exporter, profiler=profiler, config_handler=handler,
+                           config_reload_seconds=config['settings'].get('config_reload_seconds', 60),
+                           file_compression=config['settings'].get('file_compression'),
+                           dedupe_content=config['settings'].get('dedupe_content') or 'off', journal=journal,
+                           memory_guard=memory_guard, search_index=search_index), run_once
 
     except Exception as e:
         logging.critical(f"Unexpected error in create_news_crawler: {e}", exc_info=True)
@@ -190,12 +478,11 @@ if __name__ == "__main__":
     try:
         config_path = Path(__file__).resolve().parent.parent / 'config.yml'
         handler = ConfigHandler(config_path)
-        handler.process_config()
-        config = handler.load_config()
+        config = handler.process_config()
 
         with LoggingHandler.logging_context(config):
-            crawler, run_once = create_news_crawler()
-            crawler.run(run_once)
+            crawler, run_once = create_news_crawler(handler)
+            create_crawl_node(config['settings'], crawler).run(run_once)
 
     except KeyboardInterrupt:
         logging.info("Script interrupted by user.")
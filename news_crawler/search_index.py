@@ -0,0 +1,251 @@
+import argparse
+import concurrent.futures
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from archive_store import iter_archive
+from catalog import source_categories
+
+# Relevance weights for the title, text, keywords and authors columns.
+COLUMN_WEIGHTS = (10.0, 1.0, 4.0, 2.0)
+# Deleting rows from a contentless FTS5 table needs SQLite 3.43.
+CONTENTLESS_DELETE = sqlite3.sqlite_version_info >= (3, 43, 0)
+
+
+def _joined(value, separator=' '):
+    if isinstance(value, (list, tuple)):
+        return separator.join(str(item) for item in value)
+    return value or ''
+
+
+def make_row(article_data, source_name, category, path):
+    columns = (
+        article_data.get('title') or '',
+        article_data.get('text') or '',
+        _joined(article_data.get('keywords')),
+        _joined(article_data.get('authors'), ', '),
+    )
+    return (
+        article_data.get('url') or path,
+        path,
+        source_name,
+        category,
+        article_data.get('publish_date'),
+        article_data.get('title'),
+        hashlib.sha1('\x1f'.join(columns).encode('utf-8')).hexdigest(),
+        *columns,
+    )
+
+
+class SearchIndex:
+    """SQLite FTS5 full-text index over the title, text, keywords and authors of archived articles.
+
+    The FTS table is contentless, so article text is tokenized but not stored
+    a second time; result metadata lives in the ``documents`` table, indexed
+    for the date, source and category filters. Queries use FTS5 syntax:
+    ``AND``/``OR``/``NOT``, ``"exact phrases"``, ``prefix*``, ``NEAR(a b, 5)``
+    and column filters such as ``title: election``. Words are Porter-stemmed.
+
+    Re-indexing a URL whose title, text, keywords or authors changed (for
+    example once enrichment has added keywords) re-tokenizes it under a new
+    document id. The old FTS row is deleted where SQLite supports deleting from
+    contentless tables (3.43+); on older versions its tokens stay behind, but
+    document ids are never reused, so they no longer join to a document and
+    never show up in results.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = str(index_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        connection = self._connection()
+        schema = connection.execute("SELECT sql FROM sqlite_master WHERE name = 'documents'").fetchone()
+        if schema is not None and 'AUTOINCREMENT' not in schema[0]:
+            # Indexes from before ids were made unique can join stale tokens to new documents.
+            logging.warning(f"Dropping outdated search index {self.index_path}; rebuild it with search_index.py")
+            connection.executescript("DROP TABLE IF EXISTS search; DROP TABLE documents;")
+        connection.executescript(f'''
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT UNIQUE,
+                path TEXT,
+                source TEXT,
+                category TEXT,
+                publish_date TEXT,
+                title TEXT,
+                content_hash TEXT
+            );
+            CREATE INDEX IF NOT EXISTS documents_publish_date ON documents (publish_date);
+            CREATE INDEX IF NOT EXISTS documents_path ON documents (path);
+            CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5(
+                title, text, keywords, authors, content='',{" contentless_delete=1," if CONTENTLESS_DELETE else ""}
+                tokenize='porter unicode61 remove_diacritics 2'
+            );
+        ''')
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.index_path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def add(self, article_data, source_name, category, path):
+        self.add_rows([make_row(article_data, source_name, category, path)])
+
+    def add_rows(self, rows):
+        """Index ``make_row`` rows; a URL whose indexed columns are unchanged only has its metadata updated."""
+        with self._write_lock:
+            connection = self._connection()
+            for url, path, source, category, publish_date, title, columns_hash, *columns in rows:
+                existing = connection.execute("SELECT id, content_hash FROM documents WHERE url = ?", (url,)).fetchone()
+                if existing is not None and existing[1] == columns_hash:
+                    connection.execute(
+                        "UPDATE documents SET path = ?, source = ?, category = ?, publish_date = ?, title = ? WHERE id = ?",
+                        (path, source, category, publish_date, title, existing[0]))
+                    continue
+                if existing is not None:
+                    connection.execute("DELETE FROM documents WHERE id = ?", (existing[0],))
+                    if CONTENTLESS_DELETE:
+                        connection.execute("DELETE FROM search WHERE rowid = ?", (existing[0],))
+                cursor = connection.execute(
+                    "INSERT INTO documents (url, path, source, category, publish_date, title, content_hash) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (url, path, source, category, publish_date, title, columns_hash))
+                connection.execute("INSERT INTO search (rowid, title, text, keywords, authors) VALUES (?, ?, ?, ?, ?)",
+                                   (cursor.lastrowid, *columns))
+            connection.commit()
+
+    def rename_paths(self, renames):
+        """Point indexed articles at their new paths after ``(old_path, new_path)`` renames."""
+        with self._write_lock:
+            connection = self._connection()
+            connection.executemany("UPDATE documents SET path = ? WHERE path = ?", [(new, old) for old, new in renames])
+            connection.commit()
+
+    def merge_paths(self, renames):
+        """Like ``rename_paths`` for files removed as duplicates of ``new_path``.
+
+        When ``new_path`` already has a document the old one is dropped instead,
+        so one file never shows up twice in results.
+        """
+        with self._write_lock:
+            connection = self._connection()
+            for old, new in renames:
+                if connection.execute("SELECT 1 FROM documents WHERE path = ?", (new,)).fetchone() is None:
+                    connection.execute("UPDATE documents SET path = ? WHERE path = ?", (new, old))
+                    continue
+                for (document_id,) in connection.execute("SELECT id FROM documents WHERE path = ?", (old,)).fetchall():
+                    connection.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+                    if CONTENTLESS_DELETE:
+                        connection.execute("DELETE FROM search WHERE rowid = ?", (document_id,))
+            connection.commit()
+
+    def search(self, query, start_date=None, end_date=None, source=None, category=None, limit=50):
+        """Best matches for an FTS5 ``query`` as dicts, most relevant first; ``score`` grows with relevance."""
+        where, parameters = ["search MATCH ?"], [query]
+        if start_date is not None:
+            where.append("d.publish_date >= ?")
+            parameters.append(start_date)
+        if end_date is not None:
+            # publish_date is ISO text, so every timestamp on the end day sorts before 'end_date~'.
+            where.append("d.publish_date < ?")
+            parameters.append(f"{end_date}~")
+        if source is not None:
+            where.append("d.source = ?")
+            parameters.append(source)
+        if category is not None:
+            where.append("d.category = ?")
+            parameters.append(category)
+        try:
+            rows = self._connection().execute(f'''
+                SELECT d.path, d.url, d.title, d.publish_date, d.source, d.category,
+                       -bm25(search, {', '.join(str(weight) for weight in COLUMN_WEIGHTS)}) AS score
+                FROM search JOIN documents d ON d.id = search.rowid
+                WHERE {' AND '.join(where)}
+                ORDER BY score DESC LIMIT ?''', (*parameters, limit)).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid search query {query!r}: {e}") from e
+        columns = ('path', 'url', 'title', 'publish_date', 'source', 'category', 'score')
+        return [dict(zip(columns, row)) for row in rows]
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def optimize(self):
+        """Merge the FTS b-trees into one; worth running after a rebuild."""
+        with self._write_lock:
+            connection = self._connection()
+            connection.execute("INSERT INTO search (search) VALUES ('optimize')")
+            connection.commit()
+
+
+def create_search_index(settings, base_archive_directory):
+    """Open the index named by ``search_index_file``, or return None when ``search_index_enabled`` is off."""
+    if not settings.get('search_index_enabled', True):
+        return None
+    return SearchIndex(settings.get('search_index_file') or os.path.join(base_archive_directory, '.search.sqlite3'))
+
+
+def search_rows_for_directory(directory, source_name, category):
+    return [make_row(article_data, source_name, category, reference) for reference, article_data in iter_archive(directory)]
+
+
+def rebuild_search_index(search_index, base_archive_directory, categories=None, workers=4):
+    """Index an existing archive, reading one source year per worker process.
+
+    Years rather than whole sources keep the rows (which carry article text)
+    handed back from each worker small.
+    """
+    categories = categories or {}
+    units = []
+    for name in sorted(os.listdir(base_archive_directory)):
+        source_directory = os.path.join(base_archive_directory, name)
+        if name.startswith('.') or not os.path.isdir(source_directory):
+            continue
+        units += [(os.path.join(source_directory, year), name) for year in sorted(os.listdir(source_directory))
+                  if os.path.isdir(os.path.join(source_directory, year))]
+    total = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(search_rows_for_directory, directory, name, categories.get(name)): directory
+            for directory, name in units
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                rows = future.result()
+                search_index.add_rows(rows)
+                total += len(rows)
+                logging.info(f"Indexed {len(rows)} articles from {futures[future]}")
+            except Exception as e:
+                logging.error(f"Error indexing {futures[future]}: {e}", exc_info=True)
+    search_index.optimize()
+    logging.info(f"Search index rebuilt with {total} articles from {len(units)} source years")
+    return total
+
+
+if __name__ == "__main__":
+    from config_handler import ConfigHandler
+
+    parser = argparse.ArgumentParser(description='Build the full-text search index from an existing archive, or query it.')
+    parser.add_argument('--config', type=str, default=str(Path(__file__).resolve().parent.parent / 'config.yml'), help='Path to the configuration file (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=4, help='Source years read in parallel (default: %(default)s)')
+    parser.add_argument('--search', type=str, help='Print the best matches for this query instead of rebuilding')
+    parser.add_argument('--limit', type=int, default=20, help='Results printed by --search (default: %(default)s)')
+    args = parser.parse_args()
+
+    config = ConfigHandler(args.config).load_config()
+    base_archive_directory = config['settings']['base_archive_dir']
+    search_index = SearchIndex(config['settings'].get('search_index_file') or os.path.join(base_archive_directory, '.search.sqlite3'))
+    if args.search:
+        for result in search_index.search(args.search, limit=args.limit):
+            print(f"{result['score']:.2f}\t{result['publish_date']}\t{result['source']}\t{result['title']}\t{result['path']}")
+    else:
+        rebuild_search_index(search_index, base_archive_directory, source_categories(config), args.workers)
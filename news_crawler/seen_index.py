@@ -0,0 +1,93 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'cmpid', 'ocid')
+
+
+def normalize_url(url):
+    """Reduce an article URL to the form used as its identity in the index."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or 'http'
+    netloc = parts.netloc.lower()
+    if netloc.startswith('www.'):
+        netloc = netloc[4:]
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    path = parts.path.rstrip('/') or '/'
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                             if not key.lower().startswith(TRACKING_PARAMS)))
+    # Scheme is dropped so http and https variants of an article collapse to one entry.
+    return f"{netloc}{path}?{query}" if query else f"{netloc}{path}"
+
+
+def url_key(url):
+    return hashlib.blake2b(normalize_url(url).encode('utf-8'), digest_size=16).digest()
+
+
+class SeenIndex:
+    """Durable set of archived article URLs backed by SQLite.
+
+    Keys are 16 byte hashes of the normalized URL in a WITHOUT ROWID table, so a
+    lookup is a single B-tree probe even with millions of entries. Each thread
+    gets its own connection and WAL mode lets lookups run while another thread
+    is writing.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = str(index_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS seen (key BLOB PRIMARY KEY, saved_at REAL DEFAULT (julianday('now'))) WITHOUT ROWID"
+        )
+        connection.commit()
+        logging.info(f"Opened seen-URL index at {self.index_path}")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.index_path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def __contains__(self, url):
+        return self.contains(url)
+
+    def contains(self, url):
+        row = self._connection().execute("SELECT 1 FROM seen WHERE key = ?", (url_key(url),)).fetchone()
+        return row is not None
+
+    def add(self, url):
+        self.add_many([url])
+
+    def add_many(self, urls):
+        keys = [(url_key(url),) for url in urls]
+        if not keys:
+            return
+        with self._write_lock:
+            connection = self._connection()
+            connection.executemany("INSERT OR IGNORE INTO seen (key) VALUES (?)", keys)
+            connection.commit()
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def open_seen_index(settings, base_archive_directory):
+    """Open the index named by ``archive_index_file``, defaulting to one inside the archive."""
+    index_path = settings.get('archive_index_file') or os.path.join(base_archive_directory, '.seen_urls.sqlite3')
+    return SeenIndex(index_path)
@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+class SourceRecord:
+    """Failure counts for one source in a ring of fixed-width time buckets."""
+
+    def __init__(self, buckets):
+        self.counts = [0] * buckets
+        self.epochs = [-1] * buckets
+        self.disabled_until = 0.0
+
+    def to_dict(self):
+        return {'counts': self.counts, 'epochs': self.epochs, 'disabled_until': self.disabled_until}
+
+    @classmethod
+    def from_dict(cls, data, buckets):
+        record = cls(buckets)
+        if len(data.get('counts', [])) == buckets:
+            record.counts = list(data['counts'])
+            record.epochs = list(data['epochs'])
+        record.disabled_until = data.get('disabled_until', 0.0)
+        return record
+
+
+class SourceHealth:
+    """Thread-safe sliding-window failure tracking with automatic recovery.
+
+    The failure window is split into ``buckets`` slots, so recording a failure
+    touches one slot and counting the window sums a fixed number of slots,
+    regardless of how many failures there were. A source over the threshold is
+    disabled for ``cooldown_hours`` and then comes back with a clean window.
+    State lives in memory and is flushed to ``state_file`` (never config.yml)
+    every ``flush_seconds``.
+    """
+
+    def __init__(self, threshold=5, window_hours=24, cooldown_hours=12, state_file=None, flush_seconds=60, buckets=24):
+        self.threshold = threshold
+        self.bucket_width = window_hours * 3600 / buckets
+        self.buckets = buckets
+        self.cooldown = cooldown_hours * 3600
+        self.state_file = state_file
+        self.flush_seconds = flush_seconds
+        self.records = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._flush_thread = None
+        self.load()
+
+    def _record(self, url):
+        if url not in self.records:
+            self.records[url] = SourceRecord(self.buckets)
+        return self.records[url]
+
+    def _window_failures(self, record, epoch):
+        return sum(count for count, bucket_epoch in zip(record.counts, record.epochs) if epoch - bucket_epoch < self.buckets)
+
+    def record_failure(self, url, now=None):
+        """Count a failure; return True if it just pushed the source over the threshold."""
+        now = now or time.time()
+        epoch = int(now // self.bucket_width)
+        slot = epoch % self.buckets
+        with self._lock:
+            record = self._record(url)
+            if record.epochs[slot] != epoch:
+                record.epochs[slot] = epoch
+                record.counts[slot] = 0
+            record.counts[slot] += 1
+            self._dirty = True
+            if record.disabled_until > now or self._window_failures(record, epoch) <= self.threshold:
+                return False
+            record.disabled_until = now + self.cooldown
+        logging.warning(f"Disabling source {url} for {self.cooldown / 3600:.1f} hours due to repeated failures.")
+        return True
+
+    def is_available(self, url, now=None):
+        now = now or time.time()
+        with self._lock:
+            record = self.records.get(url)
+            if record is None or record.disabled_until == 0.0:
+                return True
+            if record.disabled_until > now:
+                return False
+            # Cool-down over: start the source again with a clean failure window.
+            self.records[url] = SourceRecord(self.buckets)
+            self._dirty = True
+        logging.info(f"Source {url} is back after its cool-down.")
+        return True
+
+    def disabled_sources(self):
+        now = time.time()
+        with self._lock:
+            return {url: record.disabled_until for url, record in self.records.items() if record.disabled_until > now}
+
+    def load(self):
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.records = {url: SourceRecord.from_dict(record, self.buckets) for url, record in data.get('sources', {}).items()}
+            logging.info(f"Loaded health state for {len(self.records)} sources from {self.state_file}")
+        except Exception as e:
+            logging.error(f"Failed to load source health state: {e}", exc_info=True)
+
+    def flush(self):
+        if not self.state_file:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {'sources': {url: record.to_dict() for url, record in self.records.items()}}
+            self._dirty = False
+        temporary_path = f"{self.state_file}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temporary_path, self.state_file)
+
+    def start(self):
+        """Flush the state in the background every ``flush_seconds``."""
+        def flush_periodically():
+            while not self._stop.wait(self.flush_seconds):
+                try:
+                    self.flush()
+                except Exception as e:
+                    logging.error(f"Failed to save source health state: {e}")
+
+        self._flush_thread = threading.Thread(target=flush_periodically, name='source-health', daemon=True)
+        self._flush_thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+
+def create_source_health(settings, base_archive_directory):
+    return SourceHealth(
+        threshold=settings.get('failed_source_threshold', 5),
+        window_hours=settings.get('failure_time_window_hours', 24),
+        cooldown_hours=settings.get('source_cooldown_hours', 12),
+        state_file=settings.get('source_health_file') or os.path.join(base_archive_directory, '.source_health.json'),
+        flush_seconds=settings.get('health_flush_seconds', 60),
+    ).start()
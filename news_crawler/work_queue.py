@@ -0,0 +1,196 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from seen_index import url_key
+
+SOURCE = 'source'
+ARTICLE = 'article'
+
+
+class Task:
+    """One claimed unit of work: build a source or fetch one article."""
+
+    def __init__(self, task_id, kind, url, source_url, attempts):
+        self.id = task_id
+        self.kind = kind
+        self.url = url
+        self.source_url = source_url
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Task({self.id}, {self.kind}, {self.url})"
+
+
+class WorkQueue:
+    """Source and article tasks shared by several crawler nodes, backed by SQLite.
+
+    A worker claims a batch of tasks under a lease of ``lease_seconds`` and
+    keeps renewing the leases it holds while it is alive. Tasks are completed
+    or failed only by the lease holder; a lease that runs out (the node died
+    or hung) puts the task back for another worker, and a task is given up
+    after ``max_attempts`` claims. Failed attempts are retried
+    after an exponential backoff starting at ``retry_seconds``.
+
+    Article tasks are keyed by the seen-index hash of the normalized URL and a
+    key is only ever queued once, so an article linked from several sources or
+    found by several nodes is downloaded by exactly one of them. Source tasks
+    are re-armed every cycle once their previous run has finished.
+
+    The file can live on shared storage. The rollback journal is used instead
+    of WAL because WAL's shared-memory index does not work across machines.
+    """
+
+    def __init__(self, queue_path, lease_seconds=300, max_attempts=3, retry_seconds=60):
+        self.queue_path = str(queue_path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(self.queue_path)), exist_ok=True)
+        self._local = threading.local()
+        with self._transaction() as connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    key BLOB NOT NULL,
+                    url TEXT NOT NULL,
+                    source_url TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL,
+                    owner TEXT,
+                    lease_expires REAL,
+                    error TEXT,
+                    updated_at REAL,
+                    UNIQUE (kind, key)
+                )''')
+            connection.execute("CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (kind, status, available_at)")
+            connection.execute("CREATE INDEX IF NOT EXISTS tasks_leases ON tasks (status, lease_expires)")
+        logging.info(f"Opened work queue at {self.queue_path}")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit; multi-statement changes take the write lock up front in _transaction.
+            connection = sqlite3.connect(self.queue_path, timeout=60, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=DELETE")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def add_sources(self, urls):
+        """Queue a build of each source that is not already pending or running; returns how many were queued."""
+        now = time.time()
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany('''
+                INSERT INTO tasks (kind, key, url, available_at, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (kind, key) DO UPDATE SET
+                    status = 'pending', attempts = 0, available_at = excluded.available_at, owner = NULL,
+                    lease_expires = NULL, error = NULL, updated_at = excluded.updated_at
+                WHERE status IN ('done', 'failed')''',
+                [(SOURCE, url_key(url), url, now, now) for url in urls])
+            return connection.total_changes - before
+
+    def add_articles(self, source_url, urls):
+        """Queue article URLs never queued before by any node; returns how many were new."""
+        now = time.time()
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO tasks (kind, key, url, source_url, available_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(ARTICLE, url_key(url), url, source_url, now, now) for url in urls])
+            return connection.total_changes - before
+
+    def claim(self, owner, limit=10):
+        """Lease up to ``limit`` ready tasks to ``owner``, articles before sources so fetched links drain first."""
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute('''
+                UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    owner = NULL, lease_expires = NULL, available_at = ?, error = 'lease expired', updated_at = ?
+                WHERE status = 'leased' AND lease_expires <= ?''', (self.max_attempts, now, now, now))
+            rows = []
+            for kind in (ARTICLE, SOURCE):
+                if len(rows) < limit:
+                    rows += connection.execute('''
+                        SELECT id, kind, url, source_url, attempts FROM tasks
+                        WHERE kind = ? AND status = 'pending' AND available_at <= ?
+                        ORDER BY available_at LIMIT ?''', (kind, now, limit - len(rows))).fetchall()
+            connection.executemany('''
+                UPDATE tasks SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?
+                WHERE id = ?''', [(owner, now + self.lease_seconds, now, row[0]) for row in rows])
+        return [Task(task_id, kind, url, source_url, attempts + 1) for task_id, kind, url, source_url, attempts in rows]
+
+    def renew(self, task_id, owner):
+        """Extend the lease on a task; False means the lease was lost and the task must not be worked on."""
+        cursor = self._connection().execute(
+            "UPDATE tasks SET lease_expires = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+            (time.time() + self.lease_seconds, task_id, owner))
+        return cursor.rowcount == 1
+
+    def renew_all(self, task_ids, owner):
+        """Extend the leases on several tasks at once; returns the ids whose lease was still held."""
+        expires = time.time() + self.lease_seconds
+        with self._transaction() as connection:
+            return [task_id for task_id in task_ids if connection.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+                (expires, task_id, owner)).rowcount == 1]
+
+    def complete(self, task_id, owner):
+        cursor = self._connection().execute('''
+            UPDATE tasks SET status = 'done', owner = NULL, lease_expires = NULL, error = NULL, updated_at = ?
+            WHERE id = ? AND owner = ? AND status = 'leased'
+            ''', (time.time(), task_id, owner))
+        return cursor.rowcount == 1
+
+    def fail(self, task_id, owner, error=None):
+        """Release a task after a failed attempt, to be retried later or given up after ``max_attempts``."""
+        now = time.time()
+        cursor = self._connection().execute('''
+            UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                available_at = ? + ? * (1 << (attempts - 1)), owner = NULL, lease_expires = NULL, error = ?, updated_at = ?
+            WHERE id = ? AND owner = ? AND status = 'leased'
+            ''', (self.max_attempts, now, self.retry_seconds, str(error) if error else None, now, task_id, owner))
+        return cursor.rowcount == 1
+
+    def counts(self):
+        """Number of tasks per kind and status, e.g. ``{'article': {'done': 120, 'pending': 8}}``."""
+        counts = {}
+        for kind, status, count in self._connection().execute("SELECT kind, status, COUNT(*) FROM tasks GROUP BY kind, status"):
+            counts.setdefault(kind, {})[status] = count
+        return counts
+
+    def outstanding(self, kind=None):
+        """Tasks still pending or leased, of one kind or of both."""
+        kinds = (kind,) if kind else (SOURCE, ARTICLE)
+        return sum(self._connection().execute(
+            "SELECT COUNT(*) FROM tasks WHERE kind = ? AND status IN ('pending', 'leased')", (kind,)).fetchone()[0]
+                   for kind in kinds)
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def create_work_queue(settings, base_archive_directory):
+    """Open the queue named by ``work_queue_file``, defaulting to one inside the (shared) archive."""
+    queue_path = settings.get('work_queue_file') or os.path.join(base_archive_directory, '.work_queue.sqlite3')
+    return WorkQueue(queue_path, settings.get('work_lease_seconds', 300), settings.get('work_max_attempts', 3),
+                     settings.get('work_retry_seconds', 60))